@@ -23,7 +23,25 @@ var JsNgram = new function(){
     textBase: base url to refer text files.
     keySeparator: '/' for subdirectory keys, '-' for flat file keys.
     keyExt: file ext, such as '.json'.
+    binaryIndex: true to load binary key files made by JsNgram.to_binary,
+      with keyExt '.bin'.
+    docsFile: document table of binary key files, under indexBase.
+    bucketCount: number of bucket files made by JsNgram.to_json(buckets=N),
+      0 for a file per key.
     previewSize: text length shown as preview; see LoadFullText and makeTextHilighted.
+    textStoreBase: base url of the text store made by JsNgram.to_texts,
+      such as 'idx/texts/', to load previews by chunks and titles from its table;
+      undefined to load whole text files under textBase.
+    textTableFile: table of the text store, under textStoreBase.
+    minimalCover: true to load only a minimal set of N-grams covering the query,
+      enough to find perfect matches; see planQuery.
+      partial matches are those of the N-grams loaded, so leave it false
+      when partial matches are shown.
+    keyStats: number of postings by key, to prefer rare keys in planQuery,
+      undefined when not known.
+    keyStatsDir: key statistics made by JsNgram.to_json(key_stats=N),
+      such as 'keys/' under indexBase, used unless keyStats is given;
+      only the shards of the query are loaded, see loadKeyStats.
     outputLimiter: doc or hit counts shown at once.
     outputLimiter1st: hit counts shown at the 1st time with doc.
     linkAttributes: additional atrributes to document link.
@@ -49,7 +67,15 @@ var JsNgram = new function(){
     "textBase": { value: 'txt/', writable: true, configurable: true }, 
     "keySeparator": { value: '/', writable: true, configurable: true }, 
     "keyExt": { value: '.json', writable: true, configurable: true }, 
+    "binaryIndex": { value: false, writable: true, configurable: true }, 
+    "docsFile": { value: 'docs.json', writable: true, configurable: true }, 
+    "bucketCount": { value: 0, writable: true, configurable: true }, 
     "previewSize": { value: 240, writable: true, configurable: true }, 
+    "textStoreBase": { value: undefined, writable: true, configurable: true }, 
+    "textTableFile": { value: 'table.json', writable: true, configurable: true }, 
+    "minimalCover": { value: false, writable: true, configurable: true }, 
+    "keyStats": { value: undefined, writable: true, configurable: true }, 
+    "keyStatsDir": { value: undefined, writable: true, configurable: true }, 
     "outputLimiter": { value: 100, writable: true, configurable: true }, 
     "outputLimiter1st": { value: 1, writable: true, configurable: true }, 
     "linkAttributes": { value: {
@@ -432,6 +458,45 @@ var JsNgram = new function(){
   }
   _my.indexFileName = indexFileName;
   
+  /*############
+  Method: pageFileName(text, page)
+    get json file name of a page of index to find text,
+    written by JsNgram.to_json(page_size=N) for a frequent key.
+  ############*/
+  
+  function pageFileName(text, page) {
+    return(_my.indexBase + _my.encodeKey(text) + '.p' + page + _my.keyExt);
+  }
+  _my.pageFileName = pageFileName;
+  
+  /*############
+  Method: bucketOf(text, count)
+    bucket number of key text, FNV-1a 32 bit hash of utf-16 code units.
+    bucket_of in jsngram/jsngram.py must give the same number.
+    count: number of buckets, bucketCount by default.
+  ############*/
+  
+  function bucketOf(text, count) {
+    var h = 2166136261;
+    for(var i = 0; i < text.length; i++) {
+      h ^= text.charCodeAt(i);
+      // h * 16777619 in 32 bits, without Math.imul.
+      h = (h + (h << 1) + (h << 4) + (h << 7) + (h << 8) + (h << 24)) >>> 0;
+    }
+    return(h % (count || _my.bucketCount));
+  }
+  _my.bucketOf = bucketOf;
+  
+  /*############
+  Method: bucketFileName(text)
+    get json file name of the bucket having text.
+  ############*/
+  
+  function bucketFileName(text) {
+    return(_my.indexBase + 'bucket-' + _my.bucketOf(text) + _my.keyExt);
+  }
+  _my.bucketFileName = bucketFileName;
+  
   /*############
   Method: fulltextFileName(id)
     get json file name of full text body.
@@ -443,18 +508,284 @@ var JsNgram = new function(){
   _my.fulltextFileName = fulltextFileName;
   
   /*############
-  Method: loadIndexFile(text)
+  Method: loadIndexFile(text, buckets)
     load index json file to find text.
+    buckets: requests of bucket files shared while a search,
+      so that each bucket is fetched only once.
+    a paged index file gives the header of pages, see startPaging.
   ############*/
   
-  function loadIndexFile(text) {
+  function loadIndexFile(text, buckets) {
+    if(_my.bucketCount > 0) {
+      return(_my.loadBucketFile(text, buckets || {}));
+    }
+    if(_my.binaryIndex) {
+      return(_my.loadBinaryIndexFile(text));
+    }
     return($.ajax(_my.indexFileName(text), _my.ajaxJson).fail(_my.failMessageHandler));
   }
   _my.loadIndexFile = loadIndexFile;
   
+  /*############
+  Method: loadBucketFile(text, buckets)
+    load the bucket file having text, unless it is in buckets,
+    and pick up the postings of text.
+    a key missing in the bucket fails as a missing key file does.
+  ############*/
+  
+  function loadBucketFile(text, buckets) {
+    var url = _my.bucketFileName(text);
+    if(!(url in buckets)) {
+      buckets[url] = $.ajax(url, _my.ajaxJson);
+    }
+    var deferred = $.Deferred();
+    buckets[url].done(function(data, statusText, xhr){
+      if(Object.prototype.hasOwnProperty.call(data, text)) {
+        deferred.resolveWith(this, [data[text], statusText, xhr]);
+      } else {
+        deferred.rejectWith(this, [xhr, 'error', 'Not Found']);
+      }
+    }).fail(function(xhr, ajaxOptions, thrownError){
+      deferred.rejectWith(this, [xhr, ajaxOptions, thrownError]);
+    });
+    return(deferred.promise().fail(_my.failMessageHandler));
+  }
+  _my.loadBucketFile = loadBucketFile;
+  
+  /*############
+  Method: isPagedIndex(data)
+    true if data loaded from an index file is the header of pages,
+    {total: count, pages: [[count, first doc number, last doc number], ...]},
+    instead of postings. doc numbers are indexes of docsFile.
+  ############*/
+  
+  function isPagedIndex(data) {
+    return(!!data && !Array.isArray(data) && ('pages' in data));
+  }
+  _my.isPagedIndex = isPagedIndex;
+  
+  /*############
+  Method: pagesCovering(head, ids)
+    page numbers of a paged index having any of ids.
+    ids: sorted doc numbers.
+  ############*/
+  
+  function pagesCovering(head, ids) {
+    var pages = [];
+    var i = 0;
+    for(var k = 0; k < head.pages.length; k++) {
+      var first = head.pages[k][1];
+      var last = head.pages[k][2];
+      while(i < ids.length && ids[i] < first) { i++; }
+      if(i < ids.length && ids[i] <= last) { pages.push(k); }
+    }
+    return(pages);
+  }
+  _my.pagesCovering = pagesCovering;
+  
+  /*############
+  Method: loadIndexPage(text, page)
+    load a page of index to find text, once while a search.
+  ############*/
+  
+  function loadIndexPage(text, page) {
+    var requests = _my.work.paging.requests;
+    var id = page + ':' + text;
+    if(!(id in requests)) {
+      requests[id] = $.ajax(_my.pageFileName(text, page), _my.ajaxJson).fail(_my.failMessageHandler);
+    }
+    return(requests[id]);
+  }
+  _my.loadIndexPage = loadIndexPage;
+  
+  /*############
+  Method: loadDocs()
+    load the document table of binary key files once.
+    the table is kept while indexBase and docsFile are the same.
+  ############*/
+  
+  var _docs = {};
+  
+  function loadDocs() {
+    var url = _my.indexBase + _my.docsFile;
+    if(_docs.url != url) {
+      _docs = {'url': url, 'deferred': $.ajax(url, _my.ajaxJson)};
+      _docs.deferred.fail(function(){ _docs = {}; });  // retry next time
+    }
+    return(_docs.deferred);
+  }
+  _my.loadDocs = loadDocs;
+  
+  /*############
+  Method: loadBinaryIndexFile(text)
+    load binary key file to find text, as an arraybuffer.
+    resolves with the same arguments as $.ajax for json,
+    so that the result can be treated in the same way.
+  ############*/
+  
+  function loadBinaryIndexFile(text) {
+    var url = _my.indexFileName(text);
+    var context = {'url': url};
+    var deferred = $.Deferred();
+    var xhr = new XMLHttpRequest();
+    
+    function fail() {
+      deferred.rejectWith(context, [xhr, 'error', xhr.statusText]);
+    }
+    
+    xhr.open('GET', url);
+    xhr.responseType = 'arraybuffer';
+    xhr.onload = function(){
+      if(xhr.status != 200) { return(fail()); }
+      _my.loadDocs().done(function(docs){
+        deferred.resolveWith(context, [_my.decodePostings(xhr.response, docs), 'success', xhr]);
+      }).fail(function(docsXhr, ajaxOptions, thrownError){
+        deferred.rejectWith(context, [docsXhr, ajaxOptions, thrownError]);
+      });
+    };
+    xhr.onerror = fail;
+    xhr.send();
+    return(deferred.promise().fail(_my.failMessageHandler));
+  }
+  _my.loadBinaryIndexFile = loadBinaryIndexFile;
+  
+  /*############
+  Method: decodePostings(buffer, docs)
+    decode a binary key file into an array of [docId, pos].
+    buffer: ArrayBuffer of delta encoded varints, see jsngram/bin2.py.
+    docs: document table, docId by number.
+  ############*/
+  
+  function decodePostings(buffer, docs) {
+    var bytes = new Uint8Array(buffer);
+    var i = 0;
+    
+    function next() {
+      // multiply instead of shift, not to overflow 32 bits.
+      var x = 0;
+      var mul = 1;
+      var b;
+      do {
+        b = bytes[i++];
+        x += (b & 0x7f) * mul;
+        mul *= 128;
+      } while(b & 0x80);
+      return(x);
+    }
+    
+    var postings = [];
+    if(bytes.length == 0) { return(postings); }
+    var nDocs = next();
+    var doc = 0;
+    for(var k = 0; k < nDocs; k++) {
+      doc += next();
+      var count = next();
+      var docId = docs[doc];
+      var pos = 0;
+      for(var j = 0; j < count; j++) {
+        pos += next();
+        postings.push([docId, pos]);
+      }
+    }
+    return(postings);
+  }
+  _my.decodePostings = decodePostings;
+  
+  /*############
+  Method: loadTextTable()
+    load the table of the text store once.
+    the table is kept while textStoreBase and textTableFile are the same.
+  ############*/
+  
+  var _texts = {};
+  
+  function loadTextTable() {
+    var url = _my.textStoreBase + _my.textTableFile;
+    if(_texts.url != url) {
+      _texts = {'url': url, 'deferred': $.ajax(url, _my.ajaxJson)};
+      _texts.deferred.fail(function(){ _texts = {}; });  // retry next time
+    }
+    return(_texts.deferred);
+  }
+  _my.loadTextTable = loadTextTable;
+  
+  /*############
+  Method: textChunkFileName(id, chunk)
+    get file name of a chunk of text in the text store.
+    id: number of the document in the table, not docId.
+  ############*/
+  
+  function textChunkFileName(id, chunk) {
+    return(_my.textStoreBase + id + '/' + chunk + '.txt');
+  }
+  _my.textChunkFileName = textChunkFileName;
+  
+  /*############
+  Method: loadTextChunk(id, chunk)
+    load a chunk of text, once in a search.
+  ############*/
+  
+  function loadTextChunk(id, chunk) {
+    var url = _my.textChunkFileName(id, chunk);
+    var chunks = _my.work.chunks;
+    if(!chunks) {
+      return($.ajax(url, _my.ajaxText));
+    }
+    if(!(url in chunks)) {
+      chunks[url] = $.ajax(url, _my.ajaxText);
+      chunks[url].fail(function(){ delete chunks[url]; });
+    }
+    return(chunks[url]);
+  }
+  _my.loadTextChunk = loadTextChunk;
+  
+  /*############
+  Method: loadSnippet(docId, pos, hiLen, outLen)
+    load the text around a hit from the chunks covering it.
+    resolves with the text and its position in the document,
+    that is enough for makeTextHilighted with outLen.
+  ############*/
+  
+  function loadSnippet(docId, pos, hiLen, outLen) {
+    var deferred = $.Deferred();
+    
+    _my.loadTextTable().done(function(table){
+      var info = table.docs[docId];
+      if(!info) { return(deferred.reject()); }
+      var size = table.chunk_size;
+      // the same range as makeTextHilighted takes.
+      var start = pos - Math.floor((outLen - hiLen) / 2);
+      if(start < 0) { start = 0; }
+      var end = Math.min(start + outLen, info.length);
+      if(start >= end) { return(deferred.resolve(_blankText, start)); }
+      var first = Math.floor(start / size);
+      var last = Math.floor((end - 1) / size);
+      var chunks = [];
+      for(var i = first; i <= last; i++) {
+        chunks.push(_my.loadTextChunk(info.id, i));
+      }
+      $.when.apply($, chunks).done(function(){
+        // arguments are of the request itself when only one.
+        var texts = [];
+        if(chunks.length == 1) {
+          texts.push(arguments[0]);
+        } else {
+          for(var k = 0; k < arguments.length; k++) {
+            texts.push(arguments[k][0]);
+          }
+        }
+        deferred.resolve(texts.join(_blankText), first * size);
+      }).fail(function(){ deferred.reject(); });
+    }).fail(function(){ deferred.reject(); });
+    
+    return(deferred.promise());
+  }
+  _my.loadSnippet = loadSnippet;
+  
   /*############
   Method: loadFullText(selector, docId, pos, hiLen, tag)
     load full text at id (url) and show at result.
+    with textStoreBase, load the chunks around pos only.
   ############*/
   
   function loadFullText(selector, docId, pos, hiLen, tag) {
@@ -463,6 +794,17 @@ var JsNgram = new function(){
     var esc = _my.escapeHtml;
     var outLen = _my.previewSize;
     
+    if(_my.textStoreBase) {
+      return($.when(
+        _my.loadSnippet(docId, pos, hiLen, outLen).done(function(text, offset){
+          var x = hilightFn(text, pos - offset, hiLen, outLen);
+          selector.append(contentFn([x, pos+1]));
+        }).fail(function(){
+          selector.append(contentFn([_blankText, pos+1]));
+        })
+      ));
+    }
+    
     // wrap $.ajax by $.when, 
     // because when multiple deferreds contains a fail, 
     // the surrounding when returns immediately, 
@@ -483,32 +825,56 @@ var JsNgram = new function(){
   /*############
   Method: loadTitleInfo(selector, docId)
     show document title at result.
+    titleInfo comes first, then the table of the text store if any.
   ############*/
   
   function loadTitleInfo(selector, docId) {
     var titleFn = _my.makeResultHtml.title;
     var url = _my.convertIdToUrl(docId);
     var info = _my.titleInfo[docId];
-    var title = docId;
-    if(info && info.title) {
-      title = info.title;
+    
+    function append(info) {
+      var title = docId;
+      if(info && info.title) {
+        title = info.title;
+      }
+      title = _my.escapeHtml(title);
+      return(selector.append(titleFn(url, title, [])));
     }
-    title = _my.escapeHtml(title);
     
-    return(selector.append(titleFn(url, title, [])));
+    if(info || !_my.textStoreBase) {
+      return(append(info));
+    }
+    var deferred = $.Deferred();
+    _my.loadTextTable().done(function(table){
+      deferred.resolve(append(table.docs[docId]));
+    }).fail(function(){
+      deferred.resolve(append(info));
+    });
+    return(deferred.promise());
   }
   _my.loadTitleInfo = loadTitleInfo;
   
   /*############
   Method: loadHeader(arr)
     show header at result.
+    without arr, the header of the text store is shown if any.
   ############*/
   
   function loadHeader(arr) {
     var headerFn = _my.makeResultHtml.header;
     var resultSelector = _my.resultSelector;
     
-    return(resultSelector.append(headerFn(arr)));
+    if(arr !== undefined || !_my.textStoreBase) {
+      return(resultSelector.append(headerFn(arr)));
+    }
+    var deferred = $.Deferred();
+    _my.loadTextTable().done(function(table){
+      deferred.resolve(resultSelector.append(headerFn(table.header || arr)));
+    }).fail(function(){
+      deferred.resolve(resultSelector.append(headerFn(arr)));
+    });
+    return(deferred.promise());
   }
   _my.loadHeader = loadHeader;
   
@@ -529,15 +895,43 @@ var JsNgram = new function(){
   
   _my.encodeURI = encodeURI;
   
+  /*############
+  Method: indexOfSorted(arr, x)
+    index of x in ascending array arr by binary search, or -1.
+  ############*/
+  
+  function indexOfSorted(arr, x) {
+    var lo = 0;
+    var hi = arr.length;
+    while(lo < hi) {
+      var mid = (lo + hi) >>> 1;
+      if(arr[mid] < x) {
+        lo = mid + 1;
+      } else {
+        hi = mid;
+      }
+    }
+    return((lo < arr.length && arr[lo] == x) ? lo : -1);
+  }
+  _my.indexOfSorted = indexOfSorted;
+  
   /*############
   Method: findPerfection(x, n)
     pick up perfect match from sorted result of N-gram partial matches.
     x: sorted result of match (by document)
     n: required count for perfect match
+    positions of a key in a document are in ascending order in every layout,
+    so that they are looked up by binary search.
+    key j is at work.offsets[j] of the query, or at j without offsets.
   ############*/
   
   function findPerfection(x, n) {
     var workHits = _my.work.result.hits.perfection; // hits by [pos, doc]
+    var offsets = _my.work.offsets;
+    if(!offsets) {
+      offsets = [];
+      for(var j = 0; j < n; j++) { offsets.push(j); }
+    }
     var bag = {};
     var ids = Object.keys(x);
     for(var i = 0; i < ids.length; i++) { // loop by document
@@ -560,10 +954,10 @@ var JsNgram = new function(){
       // loop by occurence at mini.
       var xxx = xx[mini];
       for(var k = 0; k < xxx.length; k++) {
-        var p = xxx[k] - mini;  // valid sequences have same p values.
+        var p = xxx[k] - offsets[mini];  // valid sequences have same p values.
         for(var j = 0; j < n; j++) {
           if(j == mini) { continue; }
-          var q = xx[j].indexOf(p + j);
+          var q = _my.indexOfSorted(xx[j], p + offsets[j]);
           if(q == -1) { break; }  // not valid
         }
         if(j == n) { // valid
@@ -593,9 +987,15 @@ var JsNgram = new function(){
     work['nWhat'] = what.length;
     work['nGram'] = _my.size;
     work['nIter'] = work['nWhat'] - work['nGram'] + 1;
-    work['texts'] = _my.generateTexts(work);
+    var texts = _my.generateTexts(work);
+    work['offsets'] = _my.planQuery(texts);
+    work['texts'] = [];
+    for(var i = 0; i < work['offsets'].length; i++) {
+      work['texts'].push(texts[work['offsets'][i]]);
+    }
     work['nText'] = work['texts'].length;
     work['result'] = {'hits':{'found':[0,0],'perfection':[0,0]}};
+    work['chunks'] = {};  // requests of text chunks, see loadTextChunk
     work['deferred'] = _my.generateDeferred(work);
     // the last one submits multiple ajax requests.
     return(work);
@@ -634,15 +1034,166 @@ var JsNgram = new function(){
   }
   _my.generateTexts = generateTexts;
   
+  /*############
+  Method: keyStatsShard(text, shards)
+    shard of the key statistics having key text, by its first character,
+    as key_stats_shard in jsngram/jsngram.py.
+  ############*/
+  
+  function keyStatsShard(text, shards) {
+    var code = text.charCodeAt(0);
+    // a surrogate pair is a character.
+    var size = (code >= 0xd800 && code < 0xdc00) ? 2 : 1;
+    return(_my.bucketOf(text.substr(0, size), shards));
+  }
+  _my.keyStatsShard = keyStatsShard;
+  
+  /*############
+  Method: loadKeyStatsHead()
+    load the head of key statistics once, {shards: N, fields: [...]}.
+    shards loaded are kept with it while indexBase and keyStatsDir are the same.
+  ############*/
+  
+  var _keyStats = {};
+  
+  function loadKeyStatsHead() {
+    var url = _my.indexBase + _my.keyStatsDir + 'head.json';
+    if(_keyStats.url != url) {
+      var ks = {'url': url, 'deferred': $.ajax(url, _my.ajaxJson),
+                'head': null, 'shards': {}, 'loaded': {}, 'stats': {}};
+      ks.deferred.done(function(head){ ks.head = head; });
+      ks.deferred.fail(function(){ if(_keyStats === ks) { _keyStats = {}; } });  // retry next time
+      _keyStats = ks;
+    }
+    return(_keyStats.deferred);
+  }
+  _my.loadKeyStatsHead = loadKeyStatsHead;
+  
+  /*############
+  Method: loadKeyStats(what)
+    load the shards of key statistics having the N-grams of what,
+    each once, before planning the query and fetching any postings.
+    resolves at once without keyStatsDir or with keyStats given,
+    and whether the shards are found or not;
+    keyCount of a key in a shard not loaded is not known.
+  ############*/
+  
+  function loadKeyStats(what) {
+    var deferred = $.Deferred();
+    if(!_my.keyStatsDir || _my.keyStats) {
+      return(deferred.resolve().promise());
+    }
+    var nGram = _my.size;
+    var texts = _my.generateTexts({'what': what, 'nWhat': what.length,
+                                   'nGram': nGram, 'nIter': what.length - nGram + 1});
+    _my.loadKeyStatsHead().done(function(head){
+      var ks = _keyStats;
+      var requests = [];
+      var shards = {};
+      for(var i = 0; i < texts.length; i++) {
+        shards[_my.keyStatsShard(texts[i], head.shards)] = true;
+      }
+      for(var shard in shards) {
+        requests.push(loadShard(ks, shard));
+      }
+      $.when.apply($, requests).always(function(){ deferred.resolve(); });
+    }).fail(function(){ deferred.resolve(); });
+    return(deferred.promise());
+    
+    function loadShard(ks, shard) {
+      if(!(shard in ks.shards)) {
+        var url = _my.indexBase + _my.keyStatsDir + shard + '.json';
+        ks.shards[shard] = $.ajax(url, _my.ajaxJson).done(function(data){
+          $.extend(ks.stats, data);
+          ks.loaded[shard] = true;
+        }).fail(function(){ delete ks.shards[shard]; });
+      }
+      return(ks.shards[shard]);
+    }
+  }
+  _my.loadKeyStats = loadKeyStats;
+  
+  /*############
+  Method: keyCount(text)
+    number of postings of text by keyStats, or by the shards of
+    key statistics loaded, 0 when not in the index,
+    or undefined when not known.
+  ############*/
+  
+  function keyCount(text) {
+    var stats = _my.keyStats;
+    if(stats) {
+      return((text in stats) ? stats[text] : 0);
+    }
+    var ks = _keyStats;
+    if(!_my.keyStatsDir || !ks.head ||
+       !ks.loaded[_my.keyStatsShard(text, ks.head.shards)]) {
+      return(undefined);
+    }
+    var entry = Object.prototype.hasOwnProperty.call(ks.stats, text) ? ks.stats[text] : null;
+    return(entry ? entry[0] : 0);
+  }
+  _my.keyCount = keyCount;
+  
+  /*############
+  Method: planQuery(texts)
+    offsets of the fewest N-grams in texts covering the query,
+    where texts[i] is the N-gram at i, as generateTexts gives.
+    perfect matches of them are those of every N-gram,
+    since every character of the query is checked by one of them.
+    among covers of the fewest N-grams, the rarest by keyCount is taken.
+    every offset without minimalCover.
+  ############*/
+  
+  function planQuery(texts) {
+    var m = texts.length;
+    var n = _my.size;
+    var offsets = [];
+    if(!_my.minimalCover || m <= 2) {
+      for(var i = 0; i < m; i++) { offsets.push(i); }
+      return(offsets);
+    }
+    // best[i]: [N-grams, postings, previous] of covers ending at i.
+    var best = [];
+    for(var i = 0; i < m; i++) {
+      var weight = _my.keyCount(texts[i]) || 0;
+      if(i == 0) {
+        best.push([1, weight, -1]);
+        continue;
+      }
+      var b = null;
+      for(var j = Math.max(0, i - n); j < i; j++) {
+        var c = [best[j][0] + 1, best[j][1] + weight, j];
+        if(!b || c[0] < b[0] || (c[0] == b[0] && c[1] < b[1])) { b = c; }
+      }
+      best.push(b);
+    }
+    for(var i = m - 1; i >= 0; i = best[i][2]) {
+      offsets.unshift(i);
+    }
+    return(offsets);
+  }
+  _my.planQuery = planQuery;
+  
   /*############
   Method: generateDeferred(work)
     generate ajax request array for each N-gram keyword after submit.
+    when keyCount tells a key is not in the index,
+    nothing is requested and the search fails as a missing key file does.
   ############*/
   
   function generateDeferred(work) {
     var deferred = [];
+    var buckets = {};
     for(var i = 0; i < work.nText; i++) {
-      deferred.push(_my.loadIndexFile(work.texts[i]));
+      if(_my.keyCount(work.texts[i]) === 0) {
+        _my.log.v1('not in the index: ', work.texts[i]);
+        _my.showResultMessage(0);
+        return([$.Deferred().reject().promise()]);
+      }
+    }
+    for(var i = 0; i < work.nText; i++) {
+      deferred.push(_my.loadIndexFile(work.texts[i], buckets));
     }
     return(deferred);
   }
@@ -800,6 +1351,15 @@ var JsNgram = new function(){
   ############*/
   
   function showPage(isPerfection, selector, doc, start, limit) {
+    var paging = _my.work.paging;
+    if(isPerfection && !doc && paging && !paging.done &&
+       Object.keys(_my.work.result.perfection).length <= start + limit) {
+      // load more pages of paged index files, to know if there are more.
+      _my.loadPagesUntil(start + limit + 1).done(function(){
+        _my.showPage(isPerfection, selector, doc, start, limit);
+      });
+      return;
+    }
     var pager = _my.showFound(isPerfection, selector, doc, start, limit);
     var deferred = pager.deferred;
     var nextStart = pager.next;
@@ -847,6 +1407,8 @@ var JsNgram = new function(){
   /*############
   Method: sortResultsByLocation(results)
     rebuild results as location sorted.
+    postings are [docId, pos] for each occurrence, or [docId, [pos, ...]]
+    made by JsNgram.to_json(grouped=True), taken as they are.
   ############*/
   
   function sortResultsByLocation(results) {
@@ -871,6 +1433,11 @@ var JsNgram = new function(){
           found[docId] = {};
           workHits[1]++;
         }
+        if(Array.isArray(pos)) {  // grouped by document
+          found[docId][j] = (j in found[docId]) ? found[docId][j].concat(pos) : pos;
+          workHits[0] += pos.length;
+          return(true);
+        }
         if(!(j in found[docId])) {
           found[docId][j] = [];
         }
@@ -883,9 +1450,135 @@ var JsNgram = new function(){
   }
   _my.sortResultsByLocation = sortResultsByLocation;
   
+  /*############
+  Method: startPaging(results)
+    start to search on paged index files, when any of results is paged.
+    pages of the key having the least postings are loaded one by one,
+    with the pages of other keys covering the same documents,
+    so that results come in the order of documents, page by page.
+    hits are counted on the pages loaded so far.
+  ############*/
+  
+  function startPaging(results) {
+    var work = _my.work;
+    var heads = [];
+    var driver = 0;
+    var minSize = Number.MAX_SAFE_INTEGER;
+    for(var j = 0; j < results.length; j++) {
+      var head = (results[j] == undefined) ? [] : results[j][0];
+      var size = _my.isPagedIndex(head) ? head.total : head.length;
+      heads.push(head);
+      if(size < minSize) {
+        minSize = size;
+        driver = j;
+      }
+    }
+    work.paging = {
+      'heads': heads,
+      'driver': driver,
+      'rounds': _my.isPagedIndex(heads[driver]) ? heads[driver].pages.length : 1,
+      'next': 0,
+      'done': false,
+      'requests': {},
+      'ids': {}
+    };
+    work.result['perfection'] = {};
+    work.result['found'] = {};
+    return(_my.loadDocs().then(function(docs){
+      for(var i = 0; i < docs.length; i++) {
+        work.paging.ids[docs[i]] = i;
+      }
+    }));
+  }
+  _my.startPaging = startPaging;
+  
+  /*############
+  Method: loadNextPages()
+    load the next page of the driver key, and pages of others covering
+    its documents, then add matches in those documents to work.result.
+  ############*/
+  
+  function loadNextPages() {
+    var work = _my.work;
+    var paging = work.paging;
+    var round = paging.next++;
+    var driverHead = paging.heads[paging.driver];
+    var first = _my.isPagedIndex(driverHead) ?
+      _my.loadIndexPage(work.texts[paging.driver], round) :
+      $.Deferred().resolve(driverHead).promise();
+    
+    return(first.then(function(data){
+      var docs = {};
+      var ids = [];
+      for(var i = 0; i < data.length; i++) {
+        var id = paging.ids[data[i][0]];
+        if(!(id in docs)) {
+          docs[id] = true;
+          ids.push(id);
+        }
+      }
+      ids.sort(function(a, b){ return(a - b); });
+      
+      var parts = [];  // postings of each text, by page
+      var deferred = [];
+      $.each(paging.heads, function(j, head){
+        if(!_my.isPagedIndex(head)) {
+          parts[j] = [head];
+          return(true);
+        }
+        parts[j] = [];
+        $.each(_my.pagesCovering(head, ids), function(k, page){
+          deferred.push(_my.loadIndexPage(work.texts[j], page).done(function(data){
+            parts[j][k] = data;
+          }));
+        });
+      });
+      
+      return($.when.apply($, deferred).then(function(){
+        if(work !== _my.work) { return; }  // another search has started.
+        var results = [];
+        for(var j = 0; j < parts.length; j++) {
+          var postings = [];
+          for(var k = 0; k < parts[j].length; k++) {
+            var part = parts[j][k];
+            for(var i = 0; i < part.length; i++) {
+              if(paging.ids[part[i][0]] in docs) { postings.push(part[i]); }
+            }
+          }
+          results.push([postings]);
+        }
+        var found = _my.sortResultsByLocation(results);
+        $.extend(work.result.perfection, _my.findPerfection(found, work.nText));
+        $.extend(work.result.found, _my.sortFoundByDocumentPosition(found));
+        if(paging.next >= paging.rounds) {
+          paging.done = true;
+        }
+      }));
+    }));
+  }
+  _my.loadNextPages = loadNextPages;
+  
+  /*############
+  Method: loadPagesUntil(count)
+    load pages until count documents match perfectly, or no pages left.
+  ############*/
+  
+  function loadPagesUntil(count) {
+    var work = _my.work;
+    if(work.paging.done || Object.keys(work.result.perfection).length >= count) {
+      return($.Deferred().resolve().promise());
+    }
+    return(_my.loadNextPages().then(function(){
+      return(_my.loadPagesUntil(count));
+    }));
+  }
+  _my.loadPagesUntil = loadPagesUntil;
+  
   /*############
   Method: whenSearchRequestDone(useArgumentsToGetAllAsArray)
     integrate multiple ajax results of N-gram search.
+    with paged index files, results are integrated page by page,
+    until enough documents to show the first page.
   ############*/
   
   function whenSearchRequestDone(useArgumentsToGetAllAsArray) {
@@ -896,6 +1589,15 @@ var JsNgram = new function(){
     var results = (work.deferred.length > 1) ? arguments : [arguments];
     log.v1('whole: ', results.length, results);
     
+    for(var j = 0; j < results.length; j++) {
+      if(results[j] != undefined && _my.isPagedIndex(results[j][0])) {
+        _my.startPaging(results).then(function(){
+          return(_my.loadPagesUntil(_my.outputLimiter + 1));
+        }).done(showResult);
+        return;
+      }
+    }
+    
     var found = _my.sortResultsByLocation(results);
     log.v1(JSON.stringify(found));
     
@@ -904,15 +1606,18 @@ var JsNgram = new function(){
     
     work.result['perfection'] = perfection;
     work.result['found'] = _my.sortFoundByDocumentPosition(found);
+    showResult();
     
-    var hits = work.result.hits;
-    _my.showResultMessage(hits.perfection);
-    log.v1('Perfection:', _my.sprintf(_my.resultCount, hits.perfection));
-    log.v1('Found:', _my.sprintf(_my.resultCount, hits.found));
-    
-    $.when(_my.loadHeader()).done(function(){
-      _my.showPage(true, _my.resultSelector, null, 0, _my.outputLimiter);
-    });
+    function showResult() {
+      var hits = work.result.hits;
+      _my.showResultMessage(hits.perfection);
+      log.v1('Perfection:', _my.sprintf(_my.resultCount, hits.perfection));
+      log.v1('Found:', _my.sprintf(_my.resultCount, hits.found));
+      
+      $.when(_my.loadHeader()).done(function(){
+        _my.showPage(true, _my.resultSelector, null, 0, _my.outputLimiter);
+      });
+    }
   }
   _my.whenSearchRequestDone = whenSearchRequestDone;
   
@@ -922,9 +1627,12 @@ var JsNgram = new function(){
   ############*/
   
   function appendSearchResult(what) {
-    _my.work = _my.startWork(what);
-    // wait until all ajax requests done.
-    $.when.apply($, _my.work.deferred).done(_my.whenSearchRequestDone);
+    // plan the query with key statistics, if any.
+    _my.loadKeyStats(what).always(function(){
+      _my.work = _my.startWork(what);
+      // wait until all ajax requests done.
+      $.when.apply($, _my.work.deferred).done(_my.whenSearchRequestDone);
+    });
   }
   _my.appendSearchResult = appendSearchResult;
   
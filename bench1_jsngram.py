@@ -0,0 +1,275 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# written for python 3 but also run on python 2
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import sys
+if sys.version_info[0]  == 2:
+    chr = unichr
+
+import os
+import json
+import codecs
+import random
+import shutil
+import tempfile
+import datetime
+try:
+    import tracemalloc  # python 3 only
+except ImportError:
+    tracemalloc = None
+
+import jsngram.jsngram
+import jsngram.dir2
+import jsngram.json2
+import jsngram.text2
+
+def bench():
+    ngram_size = 2
+    ngram_shorter = True
+    ch_ignore = r'[\s,.，．、。]+'
+    n_docs = 100
+    doc_size = 5000
+    seed = 1
+
+    def make_corpus(n_docs=n_docs, doc_size=doc_size, seed=seed):
+        """
+        generate random documents of hiragana, kanji and ascii words.
+        """
+        rnd = random.Random(seed)
+        kana = [chr(c) for c in range(0x3041, 0x3094)]
+        kanji = [chr(c) for c in range(0x4e00, 0x4e00 + 500)]
+        ascii = [chr(c) for c in range(0x61, 0x7b)]
+        data = []
+        for i in range(n_docs):
+            words = []
+            size = 0
+            while size < doc_size:
+                chars = rnd.choice((kana, kanji, ascii))
+                word = ''.join(rnd.choice(chars) for j in range(rnd.randint(1, 8)))
+                words.append(word)
+                size += len(word) + 1
+            data.append(['doc/%05d.txt' % i, ' '.join(words)])
+        return data
+
+    class JsNgramListStore(jsngram.jsngram.JsNgram):
+        """
+        posting store before compaction: a [path, start] list per occurrence.
+        """
+        def append_key(self, key):
+            if not self.has_key(key):
+                self.db[key] = []
+
+        def add_index(self, key, path, start):
+            lowkey = key.lower()
+            self.append_key(lowkey)
+            self.db[lowkey].append([path, start])
+
+        def postings(self, key):
+            return self.db[key]
+
+    def measure(cls, data):
+        """
+        peak is None without tracemalloc.
+        """
+        if tracemalloc is not None:
+            tracemalloc.start()
+        start_time = datetime.datetime.now()
+        ix = cls(ngram_size, ngram_shorter, ignore=ch_ignore)
+        for path, content in data:
+            ix.add_document(path, content)
+        span = datetime.datetime.now() - start_time
+        peak = None
+        if tracemalloc is not None:
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        postings = sum(len(ix.postings(key)) for key in ix.db)
+        return peak, span.total_seconds(), postings
+
+    def bench_suite1():
+        data = make_corpus()
+        chars = sum(len(content) for path, content in data)
+        print('%d documents, %d characters' % (len(data), chars))
+        for tag, cls in (('list [path, start]', JsNgramListStore),
+                         ('array doc id pairs', jsngram.jsngram.JsNgram)):
+            peak, seconds, postings = measure(cls, data)
+            memory = '' if peak is None else 'peak %8.1f MB  ' % (peak / 1024 / 1024)
+            print('%-20s %s%6.2f seconds  (%d postings)' %
+                  (tag, memory, seconds, postings))
+
+    def tree_size(path):
+        files = jsngram.dir2.list_files(path)
+        return len(files), sum(os.path.getsize(os.path.join(path, f)) for f in files)
+
+    def bench_suite2():
+        data = make_corpus()
+        ix = jsngram.jsngram.JsNgram(ngram_size, ngram_shorter, ignore=ch_ignore)
+        for path, content in data:
+            ix.add_document(path, content)
+        base_dir = tempfile.mkdtemp()
+        try:
+            for tag, binary in (('json', False), ('binary', True)):
+                ix.dest = os.path.join(base_dir, tag)
+                start_time = datetime.datetime.now()
+                if binary:
+                    ix.to_binary()
+                else:
+                    ix.to_json()
+                write_span = datetime.datetime.now() - start_time
+                n_files, n_bytes = tree_size(ix.dest)
+                chk = jsngram.jsngram.JsNgramReader(ix.dest, binary=binary)
+                start_time = datetime.datetime.now()
+                chk.read_files()
+                read_span = datetime.datetime.now() - start_time
+                print('%-8s %6d files %10d bytes  write %6.2f  decode %6.2f seconds' %
+                      (tag, n_files, n_bytes, write_span.total_seconds(),
+                       read_span.total_seconds()))
+        finally:
+            shutil.rmtree(base_dir)
+
+    def to_json_per_key(ix):
+        """
+        to_json before the fast writer: a hex name, ensure_dir and codecs per key.
+        """
+        for key in ix.db.keys():
+            file_name = os.path.join(ix.dest, jsngram.jsngram.key_file_name(key, ix.flat))
+            jsngram.dir2.ensure_dir(file_name)
+            with codecs.open(file_name, 'w', 'utf-8') as outfile:
+                json.dump(ix.postings(key), outfile, ensure_ascii=False)
+
+    def bench_suite3():
+        data = make_corpus()
+        ix = jsngram.jsngram.JsNgram(ngram_size, ngram_shorter, ignore=ch_ignore)
+        for path, content in data:
+            ix.add_document(path, content)
+        base_dir = tempfile.mkdtemp()
+        try:
+            for tag, write in (('per key', to_json_per_key),
+                               ('threads=1', lambda ix: ix.to_json(threads=1)),
+                               ('threads=4', lambda ix: ix.to_json(threads=4))):
+                ix.dest = os.path.join(base_dir, tag)
+                start_time = datetime.datetime.now()
+                write(ix)
+                seconds = (datetime.datetime.now() - start_time).total_seconds()
+                n_files, n_bytes = tree_size(ix.dest)
+                print('%-10s %6d files %10d bytes  %8.0f files/s %6.1f MB/s' %
+                      (tag, n_files, n_bytes, n_files / seconds,
+                       n_bytes / seconds / 1024 / 1024))
+        finally:
+            shutil.rmtree(base_dir)
+
+    def reverse_per_path(chk, paths):
+        """
+        JsNgramReader.reverse before the forward index: every posting per path.
+        """
+        for path in paths:
+            bag = {}
+            for key in chk.db.keys():
+                for val in chk.db[key]:
+                    if val[0] == path:
+                        bag.setdefault(val[1], []).append(key)
+
+    def bench_suite4():
+        data = make_corpus(n_docs=10000, doc_size=100)
+        ix = jsngram.jsngram.JsNgram(ngram_size, ngram_shorter, ignore=ch_ignore)
+        for path, content in data:
+            ix.add_document(path, content)
+        chk = jsngram.jsngram.JsNgramReader()
+        chk.db = ix.to_dict()
+        paths = [path for path, content in data]
+        sample = 10
+        start_time = datetime.datetime.now()
+        reverse_per_path(chk, paths[:sample])
+        old_span = (datetime.datetime.now() - start_time).total_seconds()
+        start_time = datetime.datetime.now()
+        chk.reverse(paths)
+        new_span = (datetime.datetime.now() - start_time).total_seconds()
+        print('%d documents: per path %6.2f seconds (estimated from %d)  forward %6.2f seconds' %
+              (len(paths), old_span * len(paths) / sample, sample, new_span))
+
+    class JsNgramPerKey(jsngram.jsngram.JsNgram):
+        """
+        N-gram extraction before the kernel: a sweep per length, folding each N-gram.
+        """
+        def add_words(self, path, content, start):
+            if len(content) == 0:
+                return
+            nn = reversed(range(1, 1+self.n)) if self.shorter else [self.n]
+            for n in nn:
+                self.add_words_re(n, path, content, start)
+
+    def bench_suite5():
+        rnd = random.Random(seed)
+        kana = [chr(c) for c in range(0x3041, 0x3094)]
+        kanji = [chr(c) for c in range(0x4e00, 0x4e00 + 500)]
+        japanese = ''.join(rnd.choice(kana + kanji) for i in range(200000))
+        words = []
+        for i in range(40000):
+            word = ''.join(rnd.choice('abcdefghijklmnopqrstuvwxyz') for j in range(rnd.randint(1, 9)))
+            words.append(word.capitalize() if rnd.random() < 0.2 else word)
+        english = ' '.join(words)
+        for tag, text in (('japanese', japanese), ('ascii', english)):
+            spans = []
+            for cls in (JsNgramPerKey, jsngram.jsngram.JsNgram):
+                best = None
+                for i in range(3):
+                    ix = cls(ngram_size, ngram_shorter, ignore=ch_ignore)
+                    start_time = datetime.datetime.now()
+                    ix.add_document('doc.txt', text)
+                    span = (datetime.datetime.now() - start_time).total_seconds()
+                    best = span if best is None else min(best, span)
+                spans.append(best)
+            print('%-8s %7d characters  per N-gram %6.3f  kernel %6.3f seconds  (x%.2f)' %
+                  (tag, len(text), spans[0], spans[1], spans[0] / spans[1]))
+
+    def bench_suite6():
+        data = make_corpus()
+        base_dir = tempfile.mkdtemp()
+        org_dir = os.path.join(base_dir, 'org')
+        try:
+            for path, content in data:
+                # zenkaku alphabets, for NFKC to have something to do.
+                content = ''.join(chr(ord(c) + 0xfee0) if 'a' <= c <= 'z' else c for c in content)
+                file_name = os.path.join(org_dir, path)
+                jsngram.dir2.ensure_dir(file_name)
+                with codecs.open(file_name, 'w', 'utf-8') as outfile:
+                    outfile.write(content)
+            entries = jsngram.dir2.list_files(org_dir)
+            
+            txt_dir = os.path.join(base_dir, 'txt')
+            
+            def two_step(dest):
+                jsngram.text2.normalize_texts(org_dir, txt_dir)
+                return jsngram.jsngram.JsNgram(ngram_size, ngram_shorter, txt_dir, dest,
+                                               ignore=ch_ignore)
+            
+            def fused(dest):
+                return jsngram.jsngram.JsNgram(ngram_size, ngram_shorter, org_dir, dest,
+                                               ignore=ch_ignore, normalize=True)
+            
+            for tag, make in (('normalize_texts, then index', two_step),
+                              ('normalize as read', fused)):
+                dest = os.path.join(base_dir, 'idx')
+                start_time = datetime.datetime.now()
+                ix = make(dest)
+                for file_name in ix.add_files_to_json(entries, False):
+                    jsngram.json2.json_end(file_name)
+                seconds = (datetime.datetime.now() - start_time).total_seconds()
+                n_bytes = tree_size(txt_dir)[1] if os.path.exists(txt_dir) else 0
+                print('%-28s %6.2f seconds  %10d bytes of normalized copies' %
+                      (tag, seconds, n_bytes))
+                for path in (dest, txt_dir):
+                    if os.path.exists(path):
+                        shutil.rmtree(path)
+        finally:
+            shutil.rmtree(base_dir)
+        
+    bench_suite1()
+    bench_suite2()
+    bench_suite3()
+    bench_suite4()
+    bench_suite5()
+    bench_suite6()
+
+if __name__ == '__main__':
+    bench()
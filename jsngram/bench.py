@@ -0,0 +1,340 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# written for python 3 but also run on python 2
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import sys
+if sys.version_info[0]  == 2:
+    chr = unichr
+
+"""
+jsngram package:
+  Simple N-gram full text search engine on JavaScript and Python.
+  https://github.com/sukuba/js-py-ngram-full-text-search
+jsngram.bench:
+  reproducible benchmark on synthetic corpora.
+
+  make_corpus gives the same documents for the same seed,
+  in japanese, english or mixed text, of any number and size.
+  run_bench indexes a corpus, writes it in a layout, loads it back,
+  searches it, and returns the measures as a dict.
+  write_results saves the list of them as a json file,
+  to track regressions and to compare layouts and modes.
+
+example:
+  python -m jsngram.bench bench.json
+"""
+
+import os
+import re
+import json
+import codecs
+import random
+import shutil
+import tempfile
+import platform
+import datetime
+from timeit import default_timer as clock
+from collections import OrderedDict
+
+try:
+    import tracemalloc  # python 3 only
+except ImportError:
+    tracemalloc = None
+
+from . import dir2
+from . import json2
+from .jsngram import JsNgram, JsNgramReader, segment_name
+from .searcher import JsNgramSearcher
+
+kinds = ('japanese', 'english', 'mixed')
+layouts = ('json', 'grouped', 'buckets', 'binary', 'segment')
+bucket_count = 64
+ch_ignore = r'[\s,.，．、。]+'
+
+hiragana = [chr(c) for c in range(0x3041, 0x3094)]
+katakana = [chr(c) for c in range(0x30a1, 0x30f5)]
+kanji = [chr(c) for c in range(0x4e00, 0x4e00 + 1000)]
+particles = ['は', 'が', 'を', 'に', 'の', 'で', 'と', 'も', 'から', 'まで']
+consonants = 'bcdfghjklmnprstvwz'
+vowels = 'aeiou'
+
+def japanese_sentence(rnd):
+    """
+    words of kanji with okurigana, katakana and particles, ending with 。
+    kanji are drawn skewed to the front, so that some N-grams are frequent.
+    """
+    words = []
+    for i in range(rnd.randint(3, 12)):
+        r = rnd.random()
+        if r < 0.6:
+            word = ''.join(kanji[int(rnd.paretovariate(1.2)) % len(kanji)]
+                           for j in range(rnd.randint(1, 3)))
+            word += ''.join(rnd.choice(hiragana) for j in range(rnd.randint(0, 2)))
+        elif r < 0.8:
+            word = ''.join(rnd.choice(katakana) for j in range(rnd.randint(2, 6)))
+        else:
+            word = ''.join(rnd.choice(hiragana) for j in range(rnd.randint(1, 4)))
+        words.append(word + rnd.choice(particles))
+        if rnd.random() < 0.2:
+            words.append('、')
+    return ''.join(words) + '。'
+
+def english_sentence(rnd):
+    """
+    words of random syllables, capitalized at the head, ending with a period.
+    """
+    words = []
+    for i in range(rnd.randint(4, 16)):
+        word = ''.join(rnd.choice(consonants) + rnd.choice(vowels)
+                       for j in range(rnd.randint(1, 4)))
+        if rnd.random() < 0.1:
+            word += ','
+        words.append(word)
+    words[0] = words[0].capitalize()
+    return ' '.join(words) + '. '
+
+def make_document(rnd, kind, size):
+    """
+    a document of about size characters.
+    """
+    sentences = []
+    length = 0
+    while length < size:
+        if kind == 'japanese' or (kind == 'mixed' and rnd.random() < 0.5):
+            sentence = japanese_sentence(rnd)
+        else:
+            sentence = english_sentence(rnd)
+        if kind == 'mixed' and rnd.random() < 0.2:
+            sentence += '\n'
+        sentences.append(sentence)
+        length += len(sentence)
+    return ''.join(sentences)
+
+def make_corpus(kind='mixed', n_docs=100, doc_size=5000, seed=1):
+    """
+    return a list of [path, content] of n_docs documents.
+    kind: 'japanese', 'english' or 'mixed'.
+    """
+    if kind not in kinds:
+        raise ValueError('unknown kind of corpus: %s' % kind)
+    rnd = random.Random(seed * len(kinds) + kinds.index(kind))
+    return [['%s/%05d.txt' % (kind, i), make_document(rnd, kind, doc_size)]
+            for i in range(n_docs)]
+
+def write_corpus(data, src):
+    """
+    write documents as utf-8 text files in src.
+    """
+    for path, content in data:
+        file_name = os.path.join(src, path)
+        dir2.ensure_dir(file_name)
+        with codecs.open(file_name, 'w', 'utf-8') as outfile:
+            outfile.write(content)
+
+def make_queries(data, count=100, n=2, seed=1, ignore=ch_ignore):
+    """
+    return count texts cut out of the documents, of 1 to n+3 characters,
+    so that most of them hit.
+    """
+    rnd = random.Random(seed)
+    splitter = re.compile(ignore)
+    queries = []
+    while len(queries) < count:
+        path, content = rnd.choice(data)
+        words = [w for w in splitter.split(content) if w]
+        if not words:
+            continue
+        word = rnd.choice(words)
+        size = min(len(word), rnd.randint(1, n + 3))
+        start = rnd.randint(0, len(word) - size)
+        queries.append(word[start:start+size])
+    return queries
+
+def tree_size(path):
+    """
+    return (number of files, bytes) of a file or a directory.
+    """
+    if os.path.isfile(path):
+        return 1, os.path.getsize(path)
+    files = dir2.list_files(path)
+    return len(files), sum(os.path.getsize(os.path.join(path, f)) for f in files)
+
+def peak_memory(func):
+    """
+    run func and return the peak of memory allocated meanwhile in bytes,
+    or None when tracemalloc is not available.
+    """
+    if tracemalloc is None:
+        func()
+        return None
+    tracemalloc.start()
+    try:
+        func()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+def percentile(xs, p):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(len(xs) * p))] if xs else None
+
+def build(data, n, shorter):
+    ix = JsNgram(n, shorter, ignore=ch_ignore)
+    for path, content in data:
+        ix.add_document(path, content)
+    return ix
+
+def write_layout(ix, layout):
+    """
+    write the index in layout, and return the source to read it from.
+    """
+    if layout == 'json':
+        ix.to_json()
+    elif layout == 'grouped':
+        ix.to_json(grouped=True)
+    elif layout == 'buckets':
+        ix.to_json(buckets=bucket_count)
+    elif layout == 'binary':
+        ix.to_binary()
+    elif layout == 'segment':
+        return ix.to_segment(os.path.join(ix.dest, segment_name))
+    else:
+        raise ValueError('unknown layout: %s' % layout)
+    return ix.dest
+
+def run_bench(kind='mixed', n_docs=100, doc_size=5000, seed=1, layout='json',
+              n=2, shorter=True, queries=100, memory=True, base_dir=None):
+    """
+    measure a build of a synthetic corpus in layout, and return the results.
+      add_document: indexing time in memory
+      peak_memory: bytes allocated at most by the same build, traced apart
+      write: time, files and bytes of the layout
+      add_files_to_json: time, files and bytes of the incremental build
+                         from text files, json layout only
+      load: time to read the whole index back by JsNgramReader
+      query: latency of queries by JsNgramSearcher in milliseconds,
+             cold with the cache cleared, warm on the second run
+    base_dir: work directory, a temporary one by default.
+    """
+    data = make_corpus(kind, n_docs, doc_size, seed)
+    chars = sum(len(content) for path, content in data)
+    result = OrderedDict()
+    result['kind'] = kind
+    result['layout'] = layout
+    result['docs'] = len(data)
+    result['chars'] = chars
+    result['n'] = n
+    result['shorter'] = shorter
+    result['seed'] = seed
+
+    work_dir = base_dir or tempfile.mkdtemp()
+    try:
+        start = clock()
+        ix = build(data, n, shorter)
+        seconds = clock() - start
+        result['add_document'] = OrderedDict([
+            ('seconds', seconds), ('chars_per_second', chars / seconds),
+            ('keys', len(ix.db)),
+            ('postings', sum(len(x) for x in ix.db.values()) // 2)])
+        if memory:
+            result['peak_memory'] = peak_memory(lambda: build(data, n, shorter))
+
+        ix.dest = os.path.join(work_dir, 'idx-%s' % layout)
+        start = clock()
+        src = write_layout(ix, layout)
+        seconds = clock() - start
+        files, size = tree_size(src)
+        result['write'] = OrderedDict([
+            ('seconds', seconds), ('files', files), ('bytes', size),
+            ('files_per_second', files / seconds)])
+
+        if layout == 'json':
+            txt_dir = os.path.join(work_dir, 'txt')
+            inc_dir = os.path.join(work_dir, 'idx-inc')
+            write_corpus(data, txt_dir)
+            inc = JsNgram(n, shorter, txt_dir, inc_dir, ignore=ch_ignore)
+            start = clock()
+            for file_name in inc.add_files_to_json(dir2.list_files(txt_dir), False):
+                json2.json_end(file_name)
+            seconds = clock() - start
+            files, size = tree_size(inc_dir)
+            result['add_files_to_json'] = OrderedDict([
+                ('seconds', seconds), ('files', files), ('bytes', size),
+                ('chars_per_second', chars / seconds)])
+
+        options = {'binary': layout == 'binary',
+                   'buckets': bucket_count if layout == 'buckets' else 0}
+        reader = JsNgramReader(src, **options)
+        start = clock()
+        reader.read_files()
+        result['load'] = OrderedDict([('seconds', clock() - start),
+                                      ('keys', len(reader.db))])
+
+        if queries:
+            texts = make_queries(data, queries, n, seed)
+            searcher = JsNgramSearcher(src, n, **options)
+            cold = []
+            warm = []
+            hits = 0
+            for text in texts:
+                searcher.reader.cache.clear()
+                start = clock()
+                found = searcher.search(text)
+                cold.append((clock() - start) * 1000)
+                start = clock()
+                searcher.search(text)
+                warm.append((clock() - start) * 1000)
+                hits += found['hits']['perfection'][0] > 0
+            result['query'] = OrderedDict([
+                ('queries', len(texts)), ('hit_queries', hits),
+                ('cold_mean_ms', sum(cold) / len(cold)),
+                ('cold_median_ms', percentile(cold, 0.5)),
+                ('cold_p95_ms', percentile(cold, 0.95)),
+                ('warm_mean_ms', sum(warm) / len(warm))])
+            if searcher.reader.segment:
+                searcher.reader.segment.close()
+        if reader.segment:
+            reader.segment.close()
+    finally:
+        if not base_dir:
+            shutil.rmtree(work_dir)
+    return result
+
+def write_results(results, file_name):
+    """
+    save results of run_bench as json, with the environment.
+    """
+    report = OrderedDict([
+        ('date', datetime.datetime.now().isoformat()),
+        ('python', platform.python_version()),
+        ('platform', platform.platform()),
+        ('results', results)])
+    dir2.ensure_dir(file_name)
+    with codecs.open(file_name, 'w', 'utf-8') as outfile:
+        json.dump(report, outfile, ensure_ascii=False, indent=1)
+
+def bench(file_name=None, n_docs=100, doc_size=5000, seed=1):
+    """
+    run every kind of corpus in every layout, print a line for each,
+    and save the results to file_name when given.
+    """
+    results = []
+    for kind in kinds:
+        for layout in layouts:
+            result = run_bench(kind, n_docs, doc_size, seed, layout,
+                               memory=(layout == layouts[0]))
+            print('%-8s %-7s add %8.0f chars/s  write %6d files %9d bytes %6.2f s'
+                  '  load %6.2f s  query %7.3f ms' %
+                  (kind, layout, result['add_document']['chars_per_second'],
+                   result['write']['files'], result['write']['bytes'],
+                   result['write']['seconds'], result['load']['seconds'],
+                   result['query']['cold_mean_ms']))
+            results.append(result)
+    if file_name:
+        write_results(results, file_name)
+    return results
+
+if __name__ == '__main__':
+    bench(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# written for python 3 but also run on python 2
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+"""
+jsngram package:
+  Simple N-gram full text search engine on JavaScript and Python.
+  https://github.com/sukuba/js-py-ngram-full-text-search
+jsngram.bin2:
+  binary posting codec, delta encoded varints
+
+layout of a key file:
+  number of documents
+  for each document in ascending id order:
+    doc id - previous doc id
+    number of positions
+    positions, each as difference from the previous one
+
+every number is a varint: 7 bits per byte, low bits first,
+the high bit set on all bytes but the last.
+
+example:
+  encode_postings([0, 3, 0, 10, 2, 1]) for [[0, 3], [0, 10], [2, 1]]
+output:
+  02 00 02 03 07 02 01 01
+"""
+
+def encode_varint(x, out):
+    """
+    append unsigned integer x to bytearray out.
+    """
+    while x > 0x7f:
+        out.append((x & 0x7f) | 0x80)
+        x >>= 7
+    out.append(x)
+
+def decode_varints(data):
+    """
+    return a list of all unsigned integers in data.
+    """
+    bag = []
+    x = 0
+    shift = 0
+    for b in bytearray(data):
+        if b & 0x80:
+            x |= (b & 0x7f) << shift
+            shift += 7
+        else:
+            bag.append(x | (b << shift))
+            x = 0
+            shift = 0
+    return bag
+
+def encode_postings(postings):
+    """
+    encode postings given as a flat sequence of doc id, start pairs.
+    postings are grouped by document and positions are sorted.
+    """
+    groups = {}
+    it = iter(postings)
+    for doc, start in zip(it, it):
+        if doc in groups:
+            groups[doc].append(start)
+        else:
+            groups[doc] = [start]
+    out = bytearray()
+    encode_varint(len(groups), out)
+    prev_doc = 0
+    for doc in sorted(groups.keys()):
+        starts = sorted(groups[doc])
+        encode_varint(doc - prev_doc, out)
+        encode_varint(len(starts), out)
+        prev = 0
+        for start in starts:
+            encode_varint(start - prev, out)
+            prev = start
+        prev_doc = doc
+    return bytes(out)
+
+def decode_postings(data, docs=None):
+    """
+    decode a key file into a list of [doc id, start].
+    docs: document table to give [path, start] instead.
+    """
+    xs = decode_varints(data)
+    bag = []
+    i = 1
+    doc = 0
+    for k in range(xs[0] if xs else 0):
+        doc += xs[i]
+        count = xs[i+1]
+        i += 2
+        path = doc if docs is None else docs[doc]
+        start = 0
+        for x in xs[i:i+count]:
+            start += x
+            bag.append([path, start])
+        i += count
+    return bag
+
+def test():
+    pairs = [[0, 3], [0, 10], [2, 1], [2, 1], [300, 70000]]
+    flat = [x for pair in pairs for x in pair]
+
+    def test_varint():
+        out = bytearray()
+        for x in (0, 1, 127, 128, 300, 2**32 - 1):
+            encode_varint(x, out)
+        res = decode_varints(out) == [0, 1, 127, 128, 300, 2**32 - 1]
+        print('[%s]: varints should round trip.  test_varint' % ('OK' if res else 'NG'))
+
+    def test_example():
+        data = encode_postings([0, 3, 0, 10, 2, 1])
+        res = bytearray(data) == bytearray([2, 0, 2, 3, 7, 2, 1, 1])
+        print('[%s]: postings should be encoded as documented.  test_example' % ('OK' if res else 'NG'))
+
+    def test_postings():
+        res = decode_postings(encode_postings(flat)) == pairs
+        print('[%s]: postings should round trip.  test_postings' % ('OK' if res else 'NG'))
+
+    def test_empty():
+        res = decode_postings(encode_postings([])) == []
+        print('[%s]: empty postings should round trip.  test_empty' % ('OK' if res else 'NG'))
+
+    def test_docs():
+        docs = dict((i, 'doc%d' % i) for i in (0, 2, 300))
+        res = decode_postings(encode_postings(flat), docs) == [[docs[d], s] for d, s in pairs]
+        print('[%s]: postings should be decoded with paths.  test_docs' % ('OK' if res else 'NG'))
+
+    test_varint()
+    test_example()
+    test_postings()
+    test_empty()
+    test_docs()
+
+if __name__ == '__main__':
+    test()
@@ -12,6 +12,14 @@ jsngram.dir2:
 """
 
 import os
+import fnmatch
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+
+try:
+    from os import scandir  # python 3.5 or later
+except ImportError:
+    scandir = None
 
 def ensure_dir(path):
     """
@@ -21,23 +29,64 @@ def ensure_dir(path):
     if not os.path.exists(parent):
         os.makedirs(parent)
     
-def list_files(path, base=None):
+def ensure_dirs(paths):
     """
-    list files in a directory recursively, excluding dot files and dot directories.
-    return array of relative to path and alwasy use '/' even on Windows.
+    make each of directories in paths once, when they do not exist.
+    good for a lot of files sharing directories.
     """
-    if not base:
-        base = path
-    bag = []
-    for entry in os.listdir(path):
+    for path in sorted(set(paths)):
+        if not os.path.exists(path):
+            os.makedirs(path)
+    
+def list_entries(path):
+    """
+    list (name, is file) of entries in a directory,
+    by the file types os.scandir has cached, without a stat per entry.
+    """
+    if scandir is None:
+        return [(entry, os.path.isfile(os.path.join(path, entry)))
+                for entry in os.listdir(path)]
+    it = scandir(path)
+    try:
+        return [(entry.name, entry.is_file()) for entry in it]
+    finally:
+        if hasattr(it, 'close'):
+            it.close()
+    
+def iter_files(path, ext=None, pattern=None, prefix=''):
+    """
+    yield files in a directory recursively, excluding dot files and dot directories,
+    in the same order as list_files, one by one.
+    paths are relative to path and alwasy use '/' even on Windows.
+    ext: extension or tuple of extensions to yield, such as '.txt'.
+    pattern: glob pattern of relative paths to yield, such as 'sub/*.txt'.
+             '*' matches '/' too, as fnmatch does.
+    prefix: prepended to the relative paths.
+    """
+    if ext is not None and not isinstance(ext, tuple):
+        ext = (ext,)
+    for entry, is_file in list_entries(path):
         if entry[0] == '.':
             continue  # skip dot files and directories
-        fullpath = '/'.join([path, entry])  # not use os.path.join
-        if os.path.isfile(fullpath):
-            bag.append(fullpath[1+len(base):])  # not use os.path.relpath
+        relpath = prefix + entry
+        if is_file:
+            if ext is not None and not entry.endswith(ext):
+                continue
+            if pattern is not None and not fnmatch.fnmatch(relpath, pattern):
+                continue
+            yield relpath
         else:
-            bag += list_files(fullpath, base)
-    return bag;
+            fullpath = '/'.join([path, entry])  # not use os.path.join
+            for x in iter_files(fullpath, ext, pattern, relpath + '/'):
+                yield x
+    
+def list_files(path, base=None):
+    """
+    list files in a directory recursively, excluding dot files and dot directories.
+    return array of relative to path and alwasy use '/' even on Windows.
+    """
+    prefix = path[1+len(base):] + '/' if base and base != path else ''
+    return list(iter_files(path, prefix=prefix))
     
 def apply_files(path, dest, func, exclude_root_files=False):
     """
@@ -62,6 +111,45 @@ def apply_files(path, dest, func, exclude_root_files=False):
             bag += apply_files(fullpath, next_dest, func)
     return bag;
     
+def _apply_file(task):
+    func, fullpath, dest = task
+    return fullpath, dest, func(fullpath, dest)
+    
+def apply_files_async(path, dest, func, exclude_root_files=False,
+                      workers=4, processes=False, ext=None, pattern=None):
+    """
+    apply 'func' to each file as apply_files does, but on a pool of workers,
+    and yield (full path of source file, destination directory, return value)
+    as each of them completes, in any order.
+    workers: number of threads, or processes when processes=True
+             (func must be a function at module level then).
+    ext, pattern: filters of files, see iter_files.
+    dest directories are created for files only, before calling func.
+    """
+    dirs = set()
+    
+    def tasks():
+        for relpath in iter_files(path, ext, pattern):
+            parts = relpath.split('/')
+            if exclude_root_files and len(parts) == 1:
+                continue
+            next_dest = None
+            if dest:
+                next_dest = os.path.join(dest, *parts[:-1])
+                if next_dest not in dirs:
+                    if not os.path.exists(next_dest):
+                        os.makedirs(next_dest)
+                    dirs.add(next_dest)
+            yield func, os.path.join(path, *parts), next_dest
+    
+    pool = multiprocessing.Pool(workers) if processes else ThreadPool(workers)
+    try:
+        for result in pool.imap_unordered(_apply_file, tasks()):
+            yield result
+    finally:
+        pool.close()
+        pool.join()
+    
 def test():
     base_dir = os.path.realpath('/scratch') # may be './scratch', or others.
     target = os.path.join(base_dir, 'hoge1')
@@ -6,6 +6,9 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 import sys
 if sys.version_info[0]  == 2:
     chr = unichr
+    intern = lambda key: key  # unicode can not be interned on python 2
+else:
+    intern = sys.intern
 
 """
 jsngram package:
@@ -18,47 +21,291 @@ jsngram.jsngram:
 import re
 import json
 import os
+import io
 import codecs
 import shutil
+import hashlib
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+from collections import OrderedDict
+from array import array
+from timeit import default_timer as clock
+try:
+    from re import _parser as sre_parse  # python 3.11 and later
+except ImportError:
+    import sre_parse
 
 from . import dir2
 from . import json2
+from . import bin2
+from . import segment
+from . import text2
+from .stats import JsNgramStats
+from .texts import write_texts, store_name
+
+posting_type = 'I'
+# postings are stored as flat pairs of unsigned int (doc id, start),
+# which costs 8 bytes per occurrence instead of a list object and a path.
+
+docs_name = 'docs.json'
+# document table of binary key files, a list of paths indexed by doc id.
+
+segment_name = 'index.seg'
+# packed single file index written by JsNgram.to_segment.
+
+manifest_name = '.manifest.json'
+manifest_keys = '.manifest/%s.json'
+# sources indexed by JsNgram.update, kept in dest,
+# and the keys of each source in a file by the sha1 of its path.
+# dot files, so that they are never taken as key files.
+
+key_file_re = re.compile(r'^([0-9a-f]{2}[-/])+[0-9a-f]{2}\.[a-z]+(\.gz)?$')
+# names made by key_file_name, to tell key files from others in dest,
+# with or without '.gz' of the gzip sibling.
+
+bucket_name = 'bucket-%d.json'
+# key files grouped by bucket_of, written by JsNgram.to_json(buckets=N).
+
+page_ext = '.p%d.json'
+# pages of postings of a key, written by JsNgram.to_json(page_size=N),
+# such as '00/61.p0.json'. the key file has the header of pages instead:
+#   {"total": number of postings,
+#    "pages": [[number of postings, first doc id, last doc id], ...]}
+# doc ids are those of docs.json, written together.
+
+key_stats_dir = 'keys'
+key_stats_head = 'head.json'
+key_stats_fields = ['postings', 'docs', 'bytes']
+# manifest of key statistics, written by to_json(key_stats=N)
+# and add_files_to_json(key_stats=N), to plan a query before loading postings:
+#   keys/head.json: {"shards": N, "fields": ["postings", "docs", "bytes"]}
+#   keys/<shard>.json: {key: [number of postings, number of documents,
+#                             bytes of its key files], ...}
+# a key is in the shard of its first character, key_stats_shard,
+# so that a query needs a few small shards, and a key missing there
+# is not in the index at all. update keeps them up to date,
+# and other writers of key files remove them (remove_key_stats).
+
+def bucket_of(key, buckets):
+    """
+    bucket number of key, FNV-1a 32 bit hash of utf-16 code units.
+    bucketOf in JsNgram.js must give the same number.
+    """
+    h = 2166136261
+    units = bytearray(key.encode('utf-16-be'))
+    for i in range(0, len(units), 2):
+        h ^= (units[i] << 8) | units[i+1]
+        h = (h * 16777619) & 0xffffffff
+    return h % buckets
+
+def is_char_set(ignore):
+    """
+    True if the compiled pattern ignore matches one or more characters of a set,
+    as the default does, so that whether a character is ignored
+    never depends on the characters around it.
+    """
+    items = list(sre_parse.parse(ignore.pattern, ignore.flags))
+    if len(items) == 1 and items[0][0] in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT):
+        low, high, repeated = items[0][1]
+        if low != 1:
+            return False
+        items = list(repeated)
+    return len(items) == 1 and items[0][0] in (sre_parse.IN, sre_parse.LITERAL,
+                                               sre_parse.NOT_LITERAL, sre_parse.ANY)
+
+def key_stats_shard(key, shards):
+    """
+    shard of the key statistics having key, by its first character.
+    """
+    return bucket_of(key[:1], shards)
+
+def key_stats_file_name(shard):
+    return '%s/%d.json' % (key_stats_dir, shard)
+
+def key_file_name(key, flat=False, ext='.json'):
+    """
+    relative file name of key, such as '00/61/00/62.json' for 'ab'.
+    """
+    sep = '-' if flat else '/'
+    h = ''.join(['%04x' % ord(c) for c in key])  # fixed length 2 bytes
+    return '%s%s' % (sep.join([h[i:i+2] for i in range(0, len(h), 2)]), ext)
+
+def file_key(file_name):
+    """
+    key of a file name made by key_file_name, such as 'ab' for '00/61/00/62.json'.
+    """
+    h = re.sub(r'[-/]', '', os.path.splitext(file_name)[0])
+    return ''.join([chr(int(h[i:i+4], 16)) for i in range(0, len(h), 4)])
+
+def page_file_name(key, page, flat=False):
+    """
+    relative file name of a page of key, such as '00/61.p0.json'.
+    """
+    return key_file_name(key, flat, page_ext % page)
+
+def page_ranges(postings, page_size):
+    """
+    split postings, flat doc id and start pairs in ascending doc ids,
+    into pages of whole documents. a page is closed at the first boundary
+    of documents after page_size postings.
+    return a list of (first, end) ranges of pair indexes.
+    """
+    n = len(postings) // 2
+    ranges = []
+    first = 0
+    while first < n:
+        end = first + page_size
+        if end >= n:
+            end = n
+        else:
+            doc = postings[2 * end - 2]
+            while end < n and postings[2 * end] == doc:
+                end += 1
+        ranges.append((first, end))
+        first = end
+    return ranges
+
+def is_paged(data):
+    """
+    True if data loaded from a key file is the header of pages.
+    """
+    return isinstance(data, dict) and 'pages' in data
+
+def postings_json(postings, docs_json):
+    """
+    json text of postings, as same as json.dumps of [[path, start], ...].
+    docs_json: json text of each path by doc id, encoded once for all keys.
+    """
+    it = iter(postings)
+    return '[%s]' % ', '.join(['[%s, %d]' % (docs_json[i], start) for i, start in zip(it, it)])
+
+def group_postings(postings):
+    """
+    group flat doc id, start pairs by document, in the order of documents,
+    as a list of [doc id, [start, ...]] with sorted starts.
+    """
+    bag = OrderedDict()
+    it = iter(postings)
+    for i, start in zip(it, it):
+        if i in bag:
+            bag[i].append(start)
+        else:
+            bag[i] = [start]
+    return [[i, sorted(starts)] for i, starts in bag.items()]
+
+def grouped_json(postings, docs_json):
+    """
+    json text of postings in the grouped layout, [[path, [start, ...]], ...].
+    """
+    return '[%s]' % ', '.join(['[%s, [%s]]' % (docs_json[i], ', '.join(['%d' % x for x in starts]))
+                               for i, starts in group_postings(postings)])
+
+def ungroup(data):
+    """
+    postings loaded from a key file as [[path, start], ...],
+    flattening the grouped layout when it is.
+    """
+    if data and isinstance(data[0][1], list):
+        return [[path, start] for path, starts in data for start in starts]
+    return data
 
 class JsNgram(object):
     """
     N-gram index storage
+    normalize: True to normalize files by text2.normal_text (NFKC) as read,
+               or a normalizer function of text (at module level for processes > 1);
+               False to index them as they are.
+               positions are those of the normalized text, just as
+               text2.normalize_texts before indexing.
     """
     def __init__(self, n=2, shorter=True, src='.', dest='.', flat=False,
-                 ignore=r'[\s,.，．、。]+'):
+                 ignore=r'[\s,.，．、。]+', normalize=False):
         self.db = {}
+        self.docs = []
+        self.doc_ids = {}
         self.n = n
         self.shorter = (shorter == True)
         self.src = os.path.realpath(src)
         self.dest = os.path.realpath(dest)
         self.flat = (flat == True)
         self.ignore = re.compile(ignore)
+        self.normalizer = text2.normal_text if normalize is True else (normalize or None)
+        self.stats = None  # jsngram.stats.JsNgramStats to instrument builds
+        
+    def clear(self):
+        self.db = {}
+        self.docs = []
+        self.doc_ids = {}
+        
+    def doc_id(self, path):
+        """
+        return a small integer id of path, registering it on the first call.
+        """
+        i = self.doc_ids.get(path)
+        if i is None:
+            i = len(self.docs)
+            self.docs.append(path)
+            self.doc_ids[path] = i
+        return i
+        
+    def normal(self, text):
+        """
+        text normalized as indexed, see normalize.
+        """
+        if self.normalizer is None:
+            return text
+        if self.stats is None:
+            return self.normalizer(text)
+        start_time = clock()
+        text = self.normalizer(text)
+        self.stats.add_time('normalize', clock() - start_time)
+        return text
+        
+    def read_source(self, path):
+        """
+        read a text file in src, normalized.
+        """
+        if self.stats is not None:
+            start_time = clock()
+        with codecs.open(os.path.join(self.src, path), 'r', 'utf-8') as infile:
+            text = infile.read()
+        if self.stats is not None:
+            self.stats.add_time('read', clock() - start_time)
+        return self.normal(text)
         
     def has_key(self, key):
-        return key in self.db.keys()
+        return key in self.db
         
     def append_key(self, key):
         if not self.has_key(key):
-            self.db[key] = []
+            self.db[key] = array(posting_type)
         
     def add_index(self, key, path, start):
         lowkey = key.lower()
         self.append_key(lowkey)
-        self.db[lowkey].append([path, start])
-        # using list instead of tuple,
-        # making reverse check from json files easy in test.
+        self.db[lowkey].extend((self.doc_id(path), start))
+        
+    def postings(self, key):
+        """
+        return postings of key as a list of [path, start].
+        using list instead of tuple,
+        making reverse check from json files easy in test.
+        """
+        docs = self.docs
+        it = iter(self.db[key])
+        return [[docs[i], start] for i, start in zip(it, it)]
+        
+    def to_dict(self):
+        """
+        return the whole index as {key: [[path, start], ...]},
+        the same shape as JsNgramReader.db.
+        """
+        return dict((key, self.postings(key)) for key in self.db)
         
     def add_words(self, path, content, start):
         if len(content) == 0:
             return
-        nn = reversed(range(1, 1+self.n)) if self.shorter else [self.n]
-        # larger n should be processed on ahead, let shorter one overwrite them.
-        for n in nn:
-            self.add_words_re(n, path, content, start)
+        self.add_grams(path, content, start, len(content), True)
         
     def add_words_re(self, n, path, content, start):
         if len(content) < n:
@@ -69,7 +316,121 @@ class JsNgram(object):
                 pos = i - n
                 self.add_index(content[pos:i], path, start + pos)
         
+    def add_words_part(self, path, content, start, limit):
+        """
+        add N-grams starting before limit, of a part of a segment
+        longer than any chunk. all lengths are taken as full windows,
+        since the segment as a whole is never shorter than n.
+        """
+        self.add_grams(path, content, start, limit, False)
+        
+    def add_grams(self, path, content, start, limit, whole):
+        """
+        add N-grams of every length starting before limit, in one sweep.
+        whole: content is a whole segment, taken as a key by itself
+               for each length longer than it.
+        the segment is case folded once, and keys are sliced from it.
+        when folding depends on the context (final sigma) or changes the length,
+        each N-gram is folded alone by add_index, as before.
+        postings of every key come out just the same either way.
+        """
+        N = len(content)
+        sizes = range(1, 1+self.n) if self.shorter else [self.n]
+        low = content.lower()
+        if len(low) != N or '\u03a3' in content:
+            for n in sizes:
+                if whole and N < n:
+                    self.add_index(content, path, start)
+                for pos in range(0, min(limit, N - n + 1)):
+                    self.add_index(content[pos:pos+n], path, start + pos)
+            return
+        
+        db = self.db
+        doc = self.doc_id(path)
+        if whole:
+            for n in sizes:
+                if N < n:
+                    key = low
+                    if key not in db:
+                        db[intern(key)] = array(posting_type)
+                    db[key].extend((doc, start))
+        for pos in range(0, min(limit, N)):
+            at = start + pos
+            for n in sizes:
+                end = pos + n
+                if end > N:
+                    break
+                key = low[pos:end]
+                postings = db.get(key)
+                if postings is None:
+                    postings = db[intern(key)] = array(posting_type)
+                postings.append(doc)
+                postings.append(at)
+        
+    def add_stream(self, path, infile, chunk_size=1024*1024):
+        """
+        add a document read from a text stream chunk by chunk,
+        giving the same postings as add_document on the whole text.
+        the segment not closed by an ignore match is carried to the next chunk,
+        and so is a match reaching the end of a chunk.
+        a segment longer than chunk_size is indexed in parts,
+        carrying its last n-1 characters, so memory is bounded by chunk_size
+        (unless a run of ignored characters is longer than that).
+        segments are split so only when ignore is a set of characters (is_char_set);
+        with other patterns, such as r'\r\n', the end of a chunk may be
+        the head of a match completed by the next one, so a segment is
+        carried as a whole, and memory is bounded by the longest segment.
+        a match of such a pattern must not depend on characters after it,
+        as 'ab(cd)?' does, to give the same postings as add_document.
+        """
+        stats = self.stats
+        if stats is not None:
+            start_time = clock()
+        carry = ''  # the rest of the text, starting at carry_start
+        carry_start = 0
+        is_part = False  # carry continues a segment indexed in parts
+        can_split = is_char_set(self.ignore)
+        while True:
+            chunk = infile.read(chunk_size)
+            is_last = not chunk
+            text = carry + chunk
+            next_start = 0
+            is_open = False  # text ends with a match, that may go on
+            for words in self.ignore.finditer(text):
+                end = words.start()
+                self.add_segment(path, text[next_start:end], carry_start + next_start, is_part)
+                is_part = False
+                next_start = words.end()
+                if next_start == len(text) and not is_last:
+                    next_start = end
+                    is_open = True
+                    break
+            rest = text[next_start:]
+            if is_last:
+                self.add_segment(path, rest, carry_start + next_start, is_part)
+                if stats is not None:
+                    stats.add_time('tokenize', clock() - start_time)
+                    stats.count('documents')
+                    stats.count('characters', carry_start + len(text))
+                return
+            limit = len(rest) - (self.n - 1)
+            if can_split and len(rest) > chunk_size and limit > 0 and not is_open:
+                self.add_words_part(path, rest, carry_start + next_start, limit)
+                is_part = True
+                next_start += limit
+            carry = text[next_start:]
+            carry_start += next_start
+        
+    def add_segment(self, path, content, start, is_part=False):
+        if is_part:
+            self.add_words_part(path, content, start, len(content))
+        else:
+            self.add_words(path, content, start)
+        
     def add_document(self, path, content):
+        stats = self.stats
+        if stats is not None:
+            start_time = clock()
         next_start = 0
         for words in self.ignore.finditer(content):
             start = next_start
@@ -77,96 +438,930 @@ class JsNgram(object):
             next_start = words.end()
             self.add_words(path, content[start:end], start)
         self.add_words(path, content[next_start:], next_start)
+        if stats is not None:
+            stats.add_time('tokenize', clock() - start_time)
+            stats.count('documents')
+            stats.count('characters', len(content))
         
-    def add_file(self, path, verbose):
+    def add_file(self, path, verbose, chunk_size=None):
+        """
+        add a text file in src.
+        chunk_size: read by chunks of this many characters, see add_stream.
+                    normalized by text2.NormalReader, taken as tokenize time.
+        """
         file_name = os.path.join(self.src, path)
         if verbose:
             print(file_name)
-        with codecs.open(file_name, 'r', 'utf-8') as infile:
-            text = infile.read()
-        self.add_document(path, text)
+        if chunk_size:
+            with io.open(file_name, 'r', encoding='utf-8', newline='') as infile:
+                if self.normalizer is not None:
+                    infile = text2.NormalReader(infile, self.normalizer)
+                self.add_stream(path, infile, chunk_size)
+            return
+        self.add_document(path, self.read_source(path))
+        
+    def add_files(self, paths, verbose=False, processes=1, files_per_task=16):
+        """
+        add files to db.
+        processes > 1 (or None for all cpus) tokenizes batches of files
+        on a process pool, then merges the partial tables in the order of paths.
+        db comes out just the same as the serial run.
+        """
+        if processes == 1:
+            total = len(paths) if hasattr(paths, '__len__') else None
+            for i, path in enumerate(paths):
+                self.add_file(path, verbose)
+                if self.stats is not None:
+                    self.stats.notify('index', i + 1, total)
+            return
+        
+        paths = list(paths)
+        tasks = []
+        for i in range(0, len(paths), files_per_task):
+            batch = paths[i:i+files_per_task]
+            # ids are fixed here, so the workers never have to be remapped.
+            ids = [self.doc_id(path) for path in batch]
+            tasks.append((self.config(), batch, ids, self.stats is not None))
+        self.run_tasks(_add_files_task, tasks, processes, verbose)
+        
+    def add_documents(self, docs, verbose=False, processes=1, docs_per_task=16):
+        """
+        add many documents at once, given as pairs of (path, content).
+        processes > 1 (or None for all cpus) tokenizes batches of documents
+        on a process pool, as add_files does.
+        db comes out just the same as add_document on each of them.
+        """
+        if processes == 1:
+            total = len(docs) if hasattr(docs, '__len__') else None
+            add_document = self.add_document
+            for i, (path, content) in enumerate(docs):
+                if verbose:
+                    print(path)
+                add_document(path, content)
+                if self.stats is not None:
+                    self.stats.notify('index', i + 1, total)
+            return
+        
+        docs = list(docs)
+        tasks = []
+        for i in range(0, len(docs), docs_per_task):
+            batch = docs[i:i+docs_per_task]
+            ids = [self.doc_id(path) for path, content in batch]
+            tasks.append((self.config(), batch, ids))
+        self.run_tasks(_add_documents_task, tasks, processes, verbose)
+        
+    def config(self):
+        """
+        arguments to make another JsNgram of the same settings.
+        """
+        return {'n': self.n, 'shorter': self.shorter, 'src': self.src,
+                'dest': self.dest, 'flat': self.flat,
+                'ignore': self.ignore.pattern, 'normalize': self.normalizer}
+        
+    def run_tasks(self, func, tasks, processes, verbose=False):
+        """
+        run tasks on a process pool, merging the partial tables in order.
+        func returns names to print when verbose, a partial table,
+        and the number of characters in it.
+        reading in workers is taken into tokenize time of stats.
+        """
+        stats = self.stats
+        if stats is not None:
+            start_time = clock()
+            total = sum(len(task[1]) for task in tasks)
+            done = 0
+        pool = multiprocessing.Pool(processes)
+        try:
+            for names, db, chars in pool.imap(func, tasks):
+                if verbose:
+                    for name in names:
+                        print(name)
+                self.merge(db)
+                if stats is not None:
+                    done += len(names)
+                    stats.count('documents', len(names))
+                    stats.count('characters', chars)
+                    stats.notify('index', done, total)
+        finally:
+            pool.close()
+            pool.join()
+        if stats is not None:
+            stats.add_time('tokenize', clock() - start_time)
         
-    def to_json(self, verbose=False):
-        sep = '-' if self.flat else '/'
+    def merge(self, db):
+        """
+        append a partial table {key: postings} made with the same doc ids.
+        """
+        for key, postings in db.items():
+            if self.has_key(key):
+                self.db[key].extend(postings)
+            else:
+                self.db[key] = postings
+        
+    def to_json(self, verbose=False, buckets=0, threads=4, page_size=0, grouped=False,
+                gzip_level=0, gzip_min_size=1024, key_stats=0):
+        """
+        write a json file of postings for each key.
+        buckets > 0 groups keys into that many bucket files of {key: postings}.
+        page_size > 0 splits postings of a key having more than that
+        into pages of whole documents, see page_ext, and writes docs.json.
+        grouped: write [[path, [start, ...]], ...], positions sorted by document,
+                 instead of a [path, start] pair for each occurrence.
+        gzip_level: 1 to 9 to write the gzip sibling (.json.gz) of each file
+                    not smaller than gzip_min_size bytes, 0 for none.
+        key_stats: number of shards of the key statistics, see key_stats_dir, 0 for none.
+        file names and directories are prepared at once,
+        then files are written on a pool of threads (threads=1 for none).
+        """
+        if not key_stats:
+            self.remove_key_stats()
+        if buckets:
+            return self.to_buckets(buckets, verbose, gzip_level, gzip_min_size, key_stats)
+        files = [(key, os.path.join(self.dest, key_file_name(key, self.flat)))
+                 for key in self.db.keys()]
+        dir2.ensure_dirs(os.path.dirname(file_name) for key, file_name in files)
+        docs_json = [json.dumps(path, ensure_ascii=False) for path in self.docs]
+        db = self.db
+        stats = self.stats
+        dump = grouped_json if grouped else postings_json
+        if page_size:
+            docs_file = os.path.join(self.dest, docs_name)
+            dir2.ensure_dir(docs_file)
+            with codecs.open(docs_file, 'w', 'utf-8') as outfile:
+                json.dump(self.docs, outfile, ensure_ascii=False)
+        
+        def write_file(file_name, make, keys, postings):
+            if stats is not None:
+                start_time = clock()
+            data = make().encode('utf-8')
+            if stats is not None:
+                serialized = clock()
+            with open(file_name, 'wb') as outfile:
+                outfile.write(data)
+            self.write_gzip(file_name, data, gzip_level, gzip_min_size)
+            if stats is not None:
+                stats.add_file(keys, postings, len(data),
+                               serialized - start_time, clock() - serialized)
+            return len(data)
+        
+        def write(item):
+            key, file_name = item
+            postings = db[key]
+            if not page_size or len(postings) <= 2 * page_size:
+                size = write_file(file_name, lambda: dump(postings, docs_json),
+                                  1, len(postings) // 2)
+                return key, file_name, size
+            pages = []
+            size = 0
+            for i, (first, end) in enumerate(page_ranges(postings, page_size)):
+                page = postings[2*first:2*end]
+                size += write_file(os.path.join(self.dest, page_file_name(key, i, self.flat)),
+                                   lambda: dump(page, docs_json), 0, end - first)
+                pages.append([end - first, page[0], page[-2]])
+            header = {'total': len(postings) // 2, 'pages': pages}
+            size += write_file(file_name, lambda: json.dumps(header), 1, 0)
+            return key, file_name, size
+            
+        if threads == 1:
+            results = (write(item) for item in files)
+        else:
+            pool = ThreadPool(threads)
+            results = pool.imap_unordered(write, files, 64)
+        sizes = {}
+        try:
+            for i, (key, file_name, size) in enumerate(results):
+                if verbose:
+                    print(file_name)
+                sizes[key] = size
+                if stats is not None:
+                    stats.notify('write', i + 1, len(files))
+        finally:
+            if threads != 1:
+                pool.close()
+                pool.join()
+        if key_stats:
+            self.write_key_stats(key_stats, sizes, False, gzip_level, gzip_min_size)
+        
+    def write_gzip(self, file_name, data, level, min_size):
+        """
+        write the gzip sibling of a file just written with data, see json2.gzip_file,
+        or remove a stale one without level.
+        """
+        if not level:
+            json2.remove_gzip(file_name)
+            return
+        stats = self.stats
+        if stats is not None:
+            start_time = clock()
+        size = json2.gzip_file(file_name, level, min_size, data)
+        if stats is not None and size is not None:
+            stats.add_gzip(len(data), size, clock() - start_time)
+        
+    def write_key_stats(self, shards, sizes, merge=False, gzip_level=0, gzip_min_size=1024):
+        """
+        write statistics of keys in db, in shards, see key_stats_dir.
+        sizes: {key: bytes of its key files}.
+        merge: add them to the statistics in dest, as add_files_to_json appends.
+        every shard is written, even empty, so that a client never misses one.
+        """
+        head_file = os.path.join(self.dest, key_stats_dir, key_stats_head)
+        if merge and os.path.exists(head_file):
+            with codecs.open(head_file, 'r', 'utf-8') as infile:
+                if json.load(infile)['shards'] != shards:
+                    raise ValueError('key statistics in %d shards already' % shards)
+        bag = {}
+        for key, postings in self.db.items():
+            entry = [len(postings) // 2, len(set(postings[0::2])), sizes.get(key, 0)]
+            shard = key_stats_shard(key, shards)
+            if shard in bag:
+                bag[shard][key] = entry
+            else:
+                bag[shard] = {key: entry}
+        dir2.ensure_dir(head_file)
+        for shard in range(shards):
+            file_name = os.path.join(self.dest, key_stats_file_name(shard))
+            data = bag.get(shard, {})
+            if merge and os.path.exists(file_name):
+                with codecs.open(file_name, 'r', 'utf-8') as infile:
+                    old = json.load(infile)
+                for key, entry in data.items():
+                    if key in old:
+                        old[key] = [a + b for a, b in zip(old[key], entry)]
+                    else:
+                        old[key] = entry
+                data = old
+            data = json.dumps(data, ensure_ascii=False).encode('utf-8')
+            with open(file_name, 'wb') as outfile:
+                outfile.write(data)
+            self.write_gzip(file_name, data, gzip_level, gzip_min_size)
+        with codecs.open(head_file, 'w', 'utf-8') as outfile:
+            json.dump({'shards': shards, 'fields': key_stats_fields}, outfile)
+        
+    def remove_key_stats(self):
+        """
+        remove key statistics in dest, if any, before key files are written
+        without them, since clients take a key missing there as not in the index.
+        """
+        path = os.path.join(self.dest, key_stats_dir)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        
+    def update_key_stats(self, entries, gzip_level=0, gzip_min_size=1024):
+        """
+        replace statistics of keys in dest, as update rewrites their key files,
+        reading and writing the shards of those keys only.
+        entries: {key: [postings, docs, bytes], or None for a key removed}.
+        nothing is done when dest has no key statistics.
+        """
+        head_file = os.path.join(self.dest, key_stats_dir, key_stats_head)
+        if not os.path.exists(head_file):
+            return
+        shards = json.loads(json2.read_text(head_file))['shards']
+        bag = {}
+        for key, entry in entries.items():
+            bag.setdefault(key_stats_shard(key, shards), {})[key] = entry
+        for shard, items in bag.items():
+            file_name = os.path.join(self.dest, key_stats_file_name(shard))
+            data = json.loads(json2.read_text(file_name)) if os.path.exists(file_name) else {}
+            for key, entry in items.items():
+                if entry is None:
+                    data.pop(key, None)
+                else:
+                    data[key] = entry
+            data = json.dumps(data, ensure_ascii=False).encode('utf-8')
+            with open(file_name, 'wb') as outfile:
+                outfile.write(data)
+            self.write_gzip(file_name, data, gzip_level, gzip_min_size)
+        
+    def to_buckets(self, buckets, verbose=False, gzip_level=0, gzip_min_size=1024,
+                   key_stats=0):
+        bag = {}
         for key in self.db.keys():
-            hxs = []
-            for c in key:
-                h = ('%#06x' % ord(c))[2:]  # fixed length 2 bytes
-                for i in range(0, len(h), 2):
-                    hxs.append(h[i:i+2])
-            file_name = os.path.join(self.dest, '%s.json' % sep.join(hxs))
+            b = bucket_of(key, buckets)
+            if b in bag:
+                bag[b].append(key)
+            else:
+                bag[b] = [key]
+        stats = self.stats
+        for i, (b, keys) in enumerate(bag.items()):
+            file_name = os.path.join(self.dest, bucket_name % b)
             if verbose:
                 print(file_name)
             dir2.ensure_dir(file_name)
-            with codecs.open(file_name, 'w', 'utf-8') as outfile:
-                json.dump(self.db[key], outfile, ensure_ascii=False)
+            if stats is not None:
+                start_time = clock()
+            data = json.dumps(dict((key, self.postings(key)) for key in keys),
+                              ensure_ascii=False).encode('utf-8')
+            if stats is not None:
+                serialized = clock()
+            with open(file_name, 'wb') as outfile:
+                outfile.write(data)
+            self.write_gzip(file_name, data, gzip_level, gzip_min_size)
+            if stats is not None:
+                stats.add_file(len(keys), sum(len(self.db[key]) for key in keys) // 2,
+                               len(data), serialized - start_time, clock() - serialized)
+                stats.notify('write', i + 1, len(bag))
+        if key_stats:
+            # bytes of the postings of each key in its bucket file.
+            sizes = dict((key, len(json.dumps(self.postings(key), ensure_ascii=False).encode('utf-8')))
+                         for key in self.db.keys())
+            self.write_key_stats(key_stats, sizes, False, gzip_level, gzip_min_size)
+        
+    def to_binary(self, verbose=False):
+        """
+        write postings as binary key files (.bin) and the document table.
+        see bin2 for the layout of key files.
+        """
+        file_name = os.path.join(self.dest, docs_name)
+        dir2.ensure_dir(file_name)
+        with codecs.open(file_name, 'w', 'utf-8') as outfile:
+            json.dump(self.docs, outfile, ensure_ascii=False)
+        stats = self.stats
+        for i, key in enumerate(self.db.keys()):
+            file_name = os.path.join(self.dest, key_file_name(key, self.flat, '.bin'))
+            if verbose:
+                print(file_name)
+            dir2.ensure_dir(file_name)
+            if stats is not None:
+                start_time = clock()
+            data = bin2.encode_postings(self.db[key])
+            if stats is not None:
+                serialized = clock()
+            with open(file_name, 'wb') as outfile:
+                outfile.write(data)
+            if stats is not None:
+                stats.add_file(1, len(self.db[key]) // 2, len(data),
+                               serialized - start_time, clock() - serialized)
+                stats.notify('write', i + 1, len(self.db))
+        
+    def to_segment(self, file_name=None, verbose=False):
+        """
+        pack all postings into a single segment file, index.seg in dest by default.
+        JsNgramReader opens it when given the file instead of a directory,
+        and JsNgramSegment.export_json makes the per key json files from it.
+        """
+        if not file_name:
+            file_name = os.path.join(self.dest, segment_name)
+        if self.stats is not None:
+            start_time = clock()
+        segment.write_segment(file_name, self.docs, self.db, verbose)
+        if self.stats is not None:
+            self.stats.add_file(len(self.db), sum(len(x) for x in self.db.values()) // 2,
+                                os.path.getsize(file_name), 0, clock() - start_time)
+        return file_name
+        
+    def to_texts(self, dest=None, chunk_size=1024, titles=None, header=None, verbose=False):
+        """
+        write the text store of the documents read from src, see jsngram.texts.
+        dest: texts in dest by default.
+        titles, header: see write_texts.
+        return the table of documents.
+        """
+        if not dest:
+            dest = os.path.join(self.dest, store_name)
+        docs = ((i, path, self.read_source(path)) for i, path in enumerate(self.docs))
+        return write_texts(docs, dest, chunk_size, titles, header, verbose)
         
-    def add_files_to_json(self, paths, verbose):
+    def add_files_to_json(self, paths, verbose, processes=1, grouped=False, key_stats=0):
         # json files will not have end tag.
-        self.db = {}
+        # grouped: append [path, [start, ...]] by document, as to_json(grouped=True).
+        # key_stats: number of shards of the key statistics, added to those in dest.
+        if not key_stats:
+            self.remove_key_stats()
+        self.clear()
         files = []
-        for path in paths:
-            self.add_file(path, verbose)
+        self.add_files(paths, verbose, processes)
         
-        sep = '-' if self.flat else '/'
-        for key in self.db.keys():
-            hxs = []
-            for c in key:
-                h = ('%#06x' % ord(c))[2:]  # fixed length 2 bytes
-                for i in range(0, len(h), 2):
-                    hxs.append(h[i:i+2])
-            file_name = os.path.join(self.dest, '%s.json' % sep.join(hxs))
+        stats = self.stats
+        sizes = {}
+        end_size = len((json2.new_line + json2.end_tag).encode('utf-8'))
+        for i, key in enumerate(self.db.keys()):
+            file_name = os.path.join(self.dest, key_file_name(key, self.flat))
             if verbose:
                 print(file_name)
             files.append(file_name)
             dir2.ensure_dir(file_name)
-            json2.json_append(file_name, self.db[key], list=True)
+            if grouped:
+                postings = [[self.docs[i], starts] for i, starts in group_postings(self.db[key])]
+            else:
+                postings = self.postings(key)
+            if stats is None and not key_stats:
+                json2.json_append(file_name, postings, list=True)
+                continue
+            # serializing is done in json_append, and taken as writing.
+            size = os.path.getsize(file_name) if os.path.exists(file_name) else None
+            start_time = clock()
+            json2.json_append(file_name, postings, list=True)
+            sizes[key] = os.path.getsize(file_name) - (size or 0)
+            if size is None:
+                sizes[key] += end_size  # of json_end to come, once a file
+            if stats is not None:
+                stats.add_file(1, len(self.db[key]) // 2, sizes[key],
+                               0, clock() - start_time, size is None)
+                stats.notify('write', i + 1, len(self.db))
         
+        if key_stats:
+            self.write_key_stats(key_stats, sizes, True)
         return(files)
+        
+    def end_json(self, files, verbose=False, gzip_level=0, gzip_min_size=1024):
+        """
+        put the end bracket on files made by add_files_to_json, see json2.json_end.
+        gzip siblings are accounted in stats, as to_json does.
+        return (bytes of files compressed, bytes of their gzip siblings).
+        """
+        stats = self.stats
+        source_size = 0
+        gzip_size = 0
+        for file_name in files:
+            start_time = clock()
+            size = json2.json_end(file_name, gzip_level, gzip_min_size)
+            if size is not None:
+                file_size = os.path.getsize(file_name)
+                source_size += file_size
+                gzip_size += size
+                if stats is not None:
+                    stats.add_gzip(file_size, size, clock() - start_time)
+            if verbose:
+                print(file_name)
+        return source_size, gzip_size
+        
+    def read_manifest(self):
+        """
+        return {path: {'size', 'mtime', 'hash'}} of sources in dest,
+        or None when dest has no manifest yet.
+        """
+        file_name = os.path.join(self.dest, manifest_name)
+        if not os.path.exists(file_name):
+            return None
+        return json.loads(json2.read_text(file_name))['sources']
+        
+    def write_manifest(self, sources):
+        file_name = os.path.join(self.dest, manifest_name)
+        dir2.ensure_dir(file_name)
+        with open(file_name, 'wb') as outfile:
+            outfile.write(json.dumps({'sources': sources}, ensure_ascii=False).encode('utf-8'))
+        
+    def manifest_keys_name(self, path):
+        """
+        file of the keys of a source, kept apart from the manifest,
+        so that an update reads and writes those of changed sources only.
+        """
+        digest = hashlib.sha1(path.encode('utf-8')).hexdigest()
+        return os.path.join(self.dest, manifest_keys % digest)
+        
+    def read_source_keys(self, path, entry):
+        if 'keys' in entry:
+            return entry['keys']  # a manifest of an older version
+        file_name = self.manifest_keys_name(path)
+        if not os.path.exists(file_name):
+            return []
+        return json.loads(json2.read_text(file_name))
+        
+    def write_source_keys(self, path, keys):
+        file_name = self.manifest_keys_name(path)
+        dir2.ensure_dir(file_name)
+        with open(file_name, 'wb') as outfile:
+            outfile.write(json.dumps(keys, ensure_ascii=False).encode('utf-8'))
+        
+    def update(self, paths=None, verbose=False, grouped=None,
+               gzip_level=0, gzip_min_size=1024):
+        """
+        update json files in dest incrementally, driven by the manifest.
+        only added or modified sources are tokenized,
+        and only key files having their postings, or those of
+        modified or deleted sources, are rewritten.
+        a source is modified when size or mtime differs and its hash too.
+        without the manifest, dest is taken as empty and fully indexed.
+        paths: sources relative to src, all files in src when None.
+        grouped: layout of new key files, see to_json; None for that of
+                 the key files in dest. a key file rewritten keeps its layout.
+        gzip_level: 1 to 9 to write gzip siblings of key files rewritten, see to_json.
+                    the sibling of a key file rewritten without it or removed is removed.
+        key statistics in dest (to_json(key_stats=N)) are kept up to date.
+        return {'added': [...], 'modified': [...], 'deleted': [...]}.
+        """
+        self.clear()
+        if paths is None:
+            paths = dir2.list_files(self.src)
+        old = self.read_manifest()
+        is_new = old is None
+        if is_new:
+            old = {}
+        sources = {}
+        changes = {'added': [], 'modified': [], 'deleted': []}
+        
+        for path in paths:
+            file_name = os.path.join(self.src, path)
+            stat = os.stat(file_name)
+            entry = old.get(path)
+            if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+                sources[path] = entry
+                continue
+            with open(file_name, 'rb') as infile:
+                raw = infile.read()
+            digest = hashlib.sha1(raw).hexdigest()
+            if entry and entry['hash'] == digest:
+                entry['mtime'] = stat.st_mtime  # touched only
+                sources[path] = entry
+                continue
+            if verbose:
+                print(file_name)
+            changes['modified' if entry else 'added'].append(path)
+            sources[path] = {'size': stat.st_size, 'mtime': stat.st_mtime,
+                             'hash': digest}
+            self.add_document(path, self.normal(raw.decode('utf-8')))
+        
+        changes['deleted'] = [path for path in old if path not in sources]
+        removed = set(changes['modified'] + changes['deleted'])
+        keys = set(self.db.keys())
+        for path in removed:
+            keys.update(self.read_source_keys(path, old[path]))
+        
+        source_keys = dict((path, []) for path in self.docs)
+        docs_json = [json.dumps(path, ensure_ascii=False) for path in self.docs]
+        doc_ids = dict(self.doc_ids)
+        # existing key files first, to see the layout before making new ones.
+        items = []
+        for key in keys:
+            file_name = os.path.join(self.dest, key_file_name(key, self.flat))
+            items.append((is_new or not os.path.exists(file_name), key, file_name))
+        items.sort()
+        key_stats = {}
+        for is_new_file, key, file_name in items:
+            # old postings of sources left, as doc id, start pairs.
+            postings = []
+            is_grouped = grouped
+            if not is_new_file:
+                data = json.loads(json2.read_text(file_name))
+                is_grouped = bool(data) and isinstance(data[0][1], list)
+                if grouped is None:
+                    grouped = is_grouped
+                for path, start in ungroup(data):
+                    if path in removed:
+                        continue
+                    i = doc_ids.get(path)
+                    if i is None:
+                        i = doc_ids[path] = len(docs_json)
+                        docs_json.append(json.dumps(path, ensure_ascii=False))
+                    postings += (i, start)
+            if self.has_key(key):
+                postings.extend(self.db[key])
+                for i in set(self.db[key][0::2]):
+                    source_keys[self.docs[i]].append(key)
+            if verbose:
+                print(file_name)
+            if postings:
+                dir2.ensure_dir(file_name)
+                dump = grouped_json if is_grouped else postings_json
+                data = dump(postings, docs_json).encode('utf-8')
+                with open(file_name, 'wb') as outfile:
+                    outfile.write(data)
+                self.write_gzip(file_name, data, gzip_level, gzip_min_size)
+                key_stats[key] = [len(postings) // 2, len(set(postings[0::2])), len(data)]
+            else:
+                if not is_new_file:
+                    os.remove(file_name)
+                    json2.remove_gzip(file_name)
+                key_stats[key] = None
+        
+        self.update_key_stats(key_stats, gzip_level, gzip_min_size)
+        for path, keys in source_keys.items():
+            self.write_source_keys(path, sorted(keys))
+        for path in changes['deleted']:
+            file_name = self.manifest_keys_name(path)
+            if os.path.exists(file_name):
+                os.remove(file_name)
+        self.write_manifest(sources)
+        return changes
+
+def _add_files_task(task):
+    """
+    worker of JsNgram.add_files, making a partial table of a batch of files.
+    """
+    config, paths, ids, counting = task
+    ix = JsNgram(**config)
+    ix.doc_ids = dict(zip(paths, ids))
+    if counting:
+        ix.stats = JsNgramStats()
+    for path in paths:
+        ix.add_file(path, False)
+    chars = ix.stats.counts['characters'] if counting else 0
+    return [os.path.join(ix.src, path) for path in paths], ix.db, chars
+
+def _add_documents_task(task):
+    """
+    worker of JsNgram.add_documents, making a partial table of a batch of documents.
+    """
+    config, docs, ids = task
+    ix = JsNgram(**config)
+    ix.doc_ids = dict((path, i) for (path, content), i in zip(docs, ids))
+    for path, content in docs:
+        ix.add_document(path, content)
+    return [path for path, content in docs], ix.db, sum(len(content) for path, content in docs)
 
 class JsNgramReader(object):
     """
-    N-gram index reader, for test purpose.
+    N-gram index reader.
+    keys are loaded on demand by read_key or read_keys, and kept in
+    an LRU cache, so that opening a reader costs nothing.
+    read_files loads the whole index into db, for tests on small indexes.
+    src: directory of key files, or a segment file.
+    buckets: number of bucket files made by JsNgram.to_json(buckets=N).
+    cache_size: number of keys cached at most, 0 for no cache.
     """
-    def __init__(self, src='.'):
+    def __init__(self, src='.', flat=False, binary=False, buckets=0,
+                 cache_size=1024):
         self.db = {}
         self.work = {}
         self.src = os.path.realpath(src)
+        self.flat = (flat == True)
+        self.binary = (binary == True)
+        self.ext = '.bin' if self.binary else '.json'
+        self.docs = None
+        self.buckets = buckets
+        self.segment = None
+        if os.path.isfile(self.src):
+            self.segment = segment.JsNgramSegment(self.src)
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.key_stats = None  # {key: [postings, docs, bytes]} of shards loaded
+        self.key_shards = None  # number of shards, 0 for no key statistics
+        self.shards_loaded = set()
+        
+    def read_docs(self):
+        """
+        load the document table of binary key files.
+        """
+        file_name = self.find_file(os.path.join(self.src, docs_name))
+        self.docs = json.loads(json2.read_text(file_name))
+        
+    def read_key_stats(self, keys=None):
+        """
+        load the key statistics of keys, or of all keys, see key_stats_dir,
+        reading each shard once, into key_stats.
+        a key of a shard loaded but missing in key_stats is not in the index.
+        return key_stats, or None when the index has no key statistics.
+        """
+        if self.key_shards is None:
+            file_name = self.find_file(os.path.join(self.src, key_stats_dir, key_stats_head))
+            self.key_shards = json.loads(json2.read_text(file_name))['shards'] if file_name else 0
+            self.key_stats = {} if self.key_shards else None
+        if not self.key_shards:
+            return None
+        if keys is None:
+            shards = range(self.key_shards)
+        else:
+            shards = set(key_stats_shard(key, self.key_shards) for key in keys if key)
+        for shard in shards:
+            if shard in self.shards_loaded:
+                continue
+            file_name = self.find_file(os.path.join(self.src, key_stats_file_name(shard)))
+            if file_name:
+                self.key_stats.update(json.loads(json2.read_text(file_name)))
+            self.shards_loaded.add(shard)
+        return self.key_stats
+        
+    def read_file(self, file_name):
+        """
+        load postings from a key file as a list of [path, start],
+        from either layout of to_json, or its gzip sibling ending with '.gz'.
+        """
+        if not self.binary:
+            data = json.loads(json2.read_text(file_name))
+            return ungroup(data) if isinstance(data, list) else data
+        if self.docs is None:
+            self.read_docs()
+        with open(file_name, 'rb') as infile:
+            return bin2.decode_postings(infile.read(), self.docs)
+        
+    def read_key(self, key):
+        """
+        load postings of key only, from its key file, bucket file or segment.
+        return None when the key is not in the index.
+        """
+        return self.read_keys([key])[key]
+        
+    def read_keys(self, keys):
+        """
+        load postings of keys as {key: postings or None},
+        from the cache or reading each key file or bucket file once.
+        """
+        bag = {}
+        missing = []
+        for key in keys:
+            postings = self.cache.pop(key, self)  # self for not cached
+            if postings is self:
+                missing.append(key)
+            else:
+                self.cache[key] = postings  # most recently used at last
+                bag[key] = postings
+                self.hits += 1
+        if missing:
+            self.misses += len(missing)
+            for key, postings in self.load_keys(missing).items():
+                self.remember(key, postings)
+                bag[key] = postings
+        return bag
+        
+    def remember(self, key, postings):
+        if not self.cache_size:
+            return
+        self.cache[key] = postings
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        
+    def cache_info(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'size': len(self.cache), 'max_size': self.cache_size}
+        
+    def prefetch(self, keys, threads=4):
+        """
+        load keys not cached yet into the cache on a pool of threads.
+        keys in the same bucket file are loaded together.
+        return the number of keys loaded.
+        """
+        groups = {}
+        for key in set(keys):
+            if key in self.cache:
+                continue
+            b = bucket_of(key, self.buckets) if self.buckets else key
+            groups.setdefault(b, []).append(key)
+        if not groups:
+            return 0
+        pool = ThreadPool(threads)
+        try:
+            results = pool.map(self.load_keys, list(groups.values()))
+        finally:
+            pool.close()
+            pool.join()
+        n = 0
+        for loaded in results:
+            for key, postings in loaded.items():
+                self.remember(key, postings)
+                n += 1
+        return n
+        
+    def load_keys(self, keys):
+        """
+        load postings of keys as {key: postings or None}, without the cache.
+        """
+        if self.segment:
+            return dict((key, self.segment.read_key(key)) for key in keys)
+        if not self.buckets:
+            return dict((key, self.read_key_file(key)) for key in keys)
+        bag = {}
+        loaded = {}
+        for key in keys:
+            b = bucket_of(key, self.buckets)
+            if b not in loaded:
+                file_name = self.find_file(os.path.join(self.src, bucket_name % b))
+                loaded[b] = self.read_file(file_name) if file_name else {}
+            bag[key] = loaded[b].get(key)
+        return bag
+        
+    def keys(self):
+        """
+        iterate keys in the index, without loading postings of key files.
+        """
+        if self.segment:
+            for key in self.segment.keys():
+                yield key
+            return
+        if self.buckets:
+            for b in range(self.buckets):
+                file_name = self.find_file(os.path.join(self.src, bucket_name % b))
+                if file_name:
+                    for key in self.read_file(file_name):
+                        yield key
+            return
+        for key, entry in self.key_entries():
+            yield key
+        
+    def key_entries(self):
+        """
+        iterate (key, file name relative to src) of key files,
+        taking the gzip sibling only when the file itself is missing.
+        """
+        entries = dir2.list_files(self.src)
+        names = set(entries)
+        for entry in entries:
+            if not key_file_re.match(entry):
+                continue
+            name = entry
+            if entry.endswith(json2.gzip_ext):
+                name = entry[:-len(json2.gzip_ext)]
+                if name in names:
+                    continue
+            if name.endswith(self.ext):
+                yield file_key(name), entry
+        
+    def find_file(self, file_name):
+        """
+        return file_name, or its gzip sibling when only that exists,
+        or None when neither exists.
+        """
+        if os.path.exists(file_name):
+            return file_name
+        if os.path.exists(file_name + json2.gzip_ext):
+            return file_name + json2.gzip_ext
+        return None
+        
+    def read_key_file(self, key):
+        data = self.read_head(key)
+        if is_paged(data):
+            data = self.read_pages(key, data)
+        return data
+        
+    def read_head(self, key):
+        """
+        load the key file of key as it is, postings or the header of pages,
+        or None when the key is not in the index.
+        """
+        file_name = self.find_file(os.path.join(self.src, key_file_name(key, self.flat, self.ext)))
+        if not file_name:
+            return None
+        return self.read_file(file_name)
+        
+    def read_page(self, key, page):
+        """
+        load postings of a page of key, see page_ext.
+        """
+        return self.read_file(self.find_file(os.path.join(self.src, page_file_name(key, page, self.flat))))
+        
+    def read_pages(self, key, header):
+        """
+        load postings of all pages of key as a list, in order.
+        """
+        bag = []
+        for page in range(len(header['pages'])):
+            bag.extend(self.read_page(key, page))
+        return bag
         
     def read_files(self, verbose=False):
         self.db = {}
-        self.work = {'files':[], 'keys':[], 'data':[]}
-        trim_ext = re.compile(r'\.json')
-        split_code = re.compile(r'[-/]')
-        for entry in dir2.list_files(self.src):
-            code = split_code.split(trim_ext.sub('', entry))
-            code2 = [code[i] + code[i+1] for i in range(0, len(code), 2)]
-            keys = [chr(int(asc, 16)) for asc in code2]
-            key = ''.join(keys)
+        self.work = {'files':[], 'keys':[]}
+        if self.segment:
+            for i, key in enumerate(self.segment.keys()):
+                data = self.segment.read_entry(i)
+                self.db[key] = data
+                self.work['keys'].append((key, list(key)))
+                if verbose:
+                    print(key, data)
+            return
+        if self.buckets:
+            for b in range(self.buckets):
+                file_name = self.find_file(os.path.join(self.src, bucket_name % b))
+                if file_name:
+                    self.db.update(self.read_file(file_name))
+            return
+        for key, entry in self.key_entries():
             file_name = os.path.join(self.src, entry)
-            with codecs.open(file_name, 'r', 'utf-8') as infile:
-                data = json.load(infile)
+            data = self.read_file(file_name)
+            if is_paged(data):
+                data = self.read_pages(key, data)
             
             self.db[key] = data
             self.work['files'].append((entry, file_name))
-            self.work['keys'].append((key, keys))
-            self.work['data'].append(data)
+            self.work['keys'].append((key, list(key)))
             
             if verbose:
-                print(entry, code, code2, key, data)
+                print(entry, key, data)
+        
+    def forward(self, paths=None):
+        """
+        build the forward index {path: {start: [keys]}} in one pass over postings,
+        restricted to paths when given.
+        uses db when read_files has been called,
+        otherwise streams key by key without keeping postings.
+        """
+        docs = None if paths is None else set(paths)
+        bag = {}
+        if self.db:
+            items = self.db.items()
+        else:
+            items = ((key, self.load_keys([key])[key]) for key in self.keys())
+        for key, postings in items:
+            for path, start in postings:
+                if docs is not None and path not in docs:
+                    continue
+                if path in bag:
+                    doc = bag[path]
+                else:
+                    doc = bag[path] = {}
+                if start in doc:
+                    doc[start].append(key)
+                else:
+                    doc[start] = [key]
+        return bag
         
     def reverse(self, paths, verbose=False):
+        forward = self.forward(paths)
         self.work['reverse'] = {}
         for path in paths:
-            bag = {}
-            for key in self.db.keys():
-                vals = self.db[key]
-                for val in vals:
-                    if(val[0] == path):
-                        rev_key = val[1]
-                        if not rev_key in bag.keys():
-                            bag[rev_key] = []
-                        bag[rev_key].append(key)
+            bag = forward.get(path, {})
             self.work['reverse'][path] = bag
             
             if verbose:
@@ -175,4 +1370,30 @@ class JsNgramReader(object):
                     print(sorted(bag[key]), end=' ')
                 print('')
         
-
+    def reconstruct(self, forward, path, fill=' '):
+        """
+        rebuild text of path from the forward index, in lower case.
+        characters never indexed, such as ignored ones, become fill.
+        """
+        doc = forward.get(path, {})
+        text = []
+        for start, keys in doc.items():
+            key = max(keys, key=len)
+            end = start + len(key)
+            if end > len(text):
+                text.extend([fill] * (end - len(text)))
+            text[start:end] = list(key)
+        return ''.join(text)
+        
+    def check(self, forward, path, content):
+        """
+        compare postings of path with its text content.
+        return a list of [start, key] not found in content.
+        """
+        content = content.lower()
+        bag = []
+        for start, keys in forward.get(path, {}).items():
+            for key in keys:
+                if content[start:start+len(key)] != key:
+                    bag.append([start, key])
+        return sorted(bag)
@@ -17,6 +17,15 @@ json_append:
 json_end:
   put an end bracket.
 
+json_write:
+  write a list of objects at once, in the same layout with the end bracket.
+
+gzip_data, gzip_file:
+  precompressed sibling (file_name + '.gz') for static hosting.
+  made with mtime 0 and no name, so the same file gives the same bytes.
+  json_append and json_write remove the sibling of the file they change,
+  so that a stale one is never served nor read.
+
 example:
   json_append('/tmp/out.json', ['a',0])
   json_append('/tmp/out.json', ['b',1])
@@ -33,9 +42,11 @@ output:
 """
 
 import os
+import io
 import codecs
 import json
 import re
+import gzip
 
 start_tag = '['
 end_tag = ']'
@@ -45,6 +56,8 @@ delimiter2 = ','
 
 re_has_end = re.compile(r'^]$')
 
+gzip_ext = '.gz'
+
 def json_append(file_name, x, list=False, end=False):
     """
     append an object to the json file.
@@ -55,6 +68,8 @@ def json_append(file_name, x, list=False, end=False):
     end: with or without the end bracket
     """
     is_new = not os.path.exists(file_name)
+    if not is_new:
+        remove_gzip(file_name)
     sep = new_line + delimiter2
     with codecs.open(file_name, 'a', 'utf-8') as outfile:
         if is_new:
@@ -69,15 +84,80 @@ def json_append(file_name, x, list=False, end=False):
         if end:
             outfile.writelines((new_line, end_tag))
     
-def json_end(file_name):
+def json_end(file_name, gzip_level=0, gzip_min_size=1024):
     """
     put an end bracket.
     file should not have any end brackets. (append without looking)
     file_name: json file name
+    gzip_level: 1 to 9 to write the gzip sibling of the completed file,
+                unless it is smaller than gzip_min_size bytes. 0 for none.
+    return the size of the gzip sibling, or None when not written.
     """
     with codecs.open(file_name, 'a', 'utf-8') as outfile:
         outfile.writelines((new_line, end_tag))
+    if gzip_level:
+        return gzip_file(file_name, gzip_level, gzip_min_size)
+
+def gzip_data(data, level=9):
+    """
+    gzip compressed bytes of data.
+    """
+    buf = io.BytesIO()
+    with gzip.GzipFile(filename='', mode='wb', compresslevel=level,
+                       fileobj=buf, mtime=0) as outfile:
+        outfile.write(data)
+    return buf.getvalue()
 
+def gzip_file(file_name, level=9, min_size=1024, data=None):
+    """
+    write file_name + '.gz', unless the file is smaller than min_size bytes.
+    data: contents of the file when already at hand, not to read it again.
+    return the size of the gzip sibling, or None when not written.
+    """
+    if data is None:
+        with open(file_name, 'rb') as infile:
+            data = infile.read()
+    if len(data) < min_size:
+        remove_gzip(file_name)
+        return None
+    packed = gzip_data(data, level)
+    with open(file_name + gzip_ext, 'wb') as outfile:
+        outfile.write(packed)
+    return len(packed)
+
+def remove_gzip(file_name):
+    """
+    remove the gzip sibling of file_name, if any, as the file is changed.
+    """
+    try:
+        os.remove(file_name + gzip_ext)
+    except OSError:
+        pass
+
+def read_text(file_name):
+    """
+    read a utf-8 text file, or its gzip sibling when file_name ends with '.gz'.
+    """
+    if file_name.endswith(gzip_ext):
+        with gzip.open(file_name, 'rb') as infile:
+            return infile.read().decode('utf-8')
+    with codecs.open(file_name, 'r', 'utf-8') as infile:
+        return infile.read()
+
+def json_write(file_name, x):
+    """
+    write a list of objects to the json file at once, overwriting it.
+    output is the same as json_append(list=True) followed by json_end.
+    file_name: json file name
+    x: list of objects to write
+    """
+    remove_gzip(file_name)
+    sep = new_line + delimiter2
+    with codecs.open(file_name, 'w', 'utf-8') as outfile:
+        outfile.writelines((start_tag, new_line, delimiter1))
+        outfile.write(sep.join((json.dumps(xx, ensure_ascii=False) for xx in x)))
+        outfile.writelines((new_line, end_tag))
+    
 def has_end(file_name):
     """
     True if the json file has an end bracket.
@@ -132,6 +212,36 @@ def test():
             os.remove(file)
         json_append(file, data, list=True, end=True)
         
+    def test_json_write():
+        if os.path.exists(file):
+            os.remove(file)
+        json_append(file, data, list=True)
+        json_end(file)
+        with codecs.open(file, 'r', 'utf-8') as infile:
+            appended = infile.read()
+        json_write(file, data)
+        with codecs.open(file, 'r', 'utf-8') as infile:
+            written = infile.read()
+        res = appended == written
+        print('[%s]: json_write should match json_append.  test_json_write' % ('OK' if res else 'NG'))
+        
+    def test_gzip():
+        for name in (file, file + gzip_ext):
+            if os.path.exists(name):
+                os.remove(name)
+        json_append(file, data, list=True)
+        small = json_end(file, 9, 1024 * 1024)
+        json_append(file + '2', data, list=True)
+        size = json_end(file + '2', 9, 0)
+        with open(file + '2' + gzip_ext, 'rb') as infile:
+            packed = infile.read()
+        res = (small is None and not os.path.exists(file + gzip_ext) and
+               size == len(packed) and packed == gzip_data(open(file + '2', 'rb').read()) and
+               json.loads(read_text(file + '2' + gzip_ext)) == data)
+        os.remove(file + '2')
+        os.remove(file + '2' + gzip_ext)
+        print('[%s]: gzip sibling should be written over min size.  test_gzip' % ('OK' if res else 'NG'))
+        
     
     test_json_append1()
     test_json_append2()
@@ -141,6 +251,9 @@ def test():
     test_has_end()
     test_json_append3()
     test_json_match('#2')
+    test_json_write()
+    test_json_match('#3')
+    test_gzip()
 
 if __name__ == '__main__':
     test()
@@ -0,0 +1,325 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# written for python 3 but also run on python 2
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+"""
+jsngram package:
+  Simple N-gram full text search engine on JavaScript and Python.
+  https://github.com/sukuba/js-py-ngram-full-text-search
+jsngram.searcher:
+  N-gram search on json index files, for server side and batch use.
+
+  a query is split into N-grams as generateTexts in JsNgram.js does,
+  and planned as planQuery does: only a minimal set of N-grams
+  covering the query is needed to find perfect matches,
+  preferring rare keys when key_stats is given,
+  or when the index has key statistics (JsNgram.to_json(key_stats=N)),
+  whose shards are loaded for the N-grams of the query only.
+  a query having an N-gram known to be missing ends there,
+  without loading any key file.
+  only the key files of those N-grams are loaded,
+  and documents are intersected starting from the least frequent key.
+  positions are checked by galloping search on sorted lists,
+  instead of indexOf in findPerfection.
+
+  search(text, limit=N) on paged key files (JsNgram.to_json(page_size=N))
+  loads the pages of the least frequent key one by one,
+  with only the pages of other keys covering the same documents,
+  and stops once N documents match perfectly.
+"""
+
+from bisect import bisect_left
+
+from .jsngram import JsNgramReader, is_paged
+
+class JsNgramSearcher(object):
+    """
+    N-gram searcher giving the same matches as JsNgram.js.
+    cover: load a minimal cover of the query, as minimalCover of JsNgram.js,
+           unless partial matches are asked, that need every N-gram.
+    """
+    def __init__(self, src='.', n=2, flat=False, binary=False, buckets=0, cover=True):
+        self.n = n
+        self.reader = JsNgramReader(src, flat, binary, buckets)
+        self.cover = cover
+        self.key_stats = None  # {key: number of postings} to plan by, if known
+
+    def normalize_text(self, text):
+        return text.lower()
+
+    def generate_texts(self, what):
+        """
+        N-gram splitted keyword texts, as same as generateTexts.
+        """
+        n = self.n
+        texts = [what[i:i+n] for i in range(len(what) - n + 1)]
+        if len(what) < n:
+            texts.append(what)
+        return texts
+
+    def has_stats(self):
+        return self.key_stats is not None or self.reader.key_stats is not None
+
+    def key_count(self, text):
+        """
+        number of postings of text by key_stats, or by the key statistics
+        of the index, 0 when not in the index.
+        """
+        if self.key_stats is not None:
+            return self.key_stats.get(text, 0)
+        entry = self.reader.key_stats.get(text)
+        return entry[0] if entry else 0
+
+    def plan_texts(self, what):
+        """
+        (offsets, texts) of N-grams of what to load, see plan_cover.
+        """
+        texts = self.generate_texts(what)
+        if self.key_stats is None:
+            self.reader.read_key_stats(texts)
+        if not self.cover:
+            return list(range(len(texts))), texts
+        count = self.key_count if self.has_stats() else None
+        offsets = plan_cover(texts, self.n, count)
+        return offsets, [texts[i] for i in offsets]
+
+    def load_keys(self, texts):
+        """
+        return {text: postings} loading each distinct text once,
+        or None when any of them is not in the index.
+        """
+        bag = self.reader.read_keys(set(texts))
+        if None in bag.values():
+            return None
+        return bag
+
+    def search(self, text, partial=False, limit=None):
+        """
+        search text and return a dict like work.result of JsNgram.js.
+          perfection: {doc: [[pos], ...]} of perfect matches.
+          found: {doc: [[pos, text], ...]} of partial matches, when partial=True.
+          hits: {'perfection': [hits, docs], 'found': [hits, docs]}
+        each perfect match position is listed once, in ascending order.
+        limit: stop loading pages once this many documents match perfectly.
+               the result has more=True when pages are left,
+               and found covers the documents of the pages loaded only.
+        """
+        result = {'perfection': {}, 'hits': {'perfection': [0, 0], 'found': [0, 0]}}
+        if partial:
+            result['found'] = {}
+        what = self.normalize_text(text)
+        if not what:
+            return result
+        if partial:
+            texts = self.generate_texts(what)
+            offsets = None
+        else:
+            offsets, texts = self.plan_texts(what)
+            if self.has_stats() and not all(self.key_count(x) for x in texts):
+                return result  # a key known to be missing, nothing loaded.
+        if limit:
+            result['more'] = False
+            postings = self.load_heads(texts)
+            if postings is not None and any(is_paged(x) for x in postings.values()):
+                self.search_pages(texts, postings, partial, limit, result, offsets)
+                return count_hits(result, partial)
+        else:
+            postings = self.load_keys(texts)
+        if postings is None:
+            return result  # as JsNgram.js, a missing key means nothing found.
+
+        result['perfection'] = find_perfection(texts, postings, offsets)
+        if partial:
+            result['found'] = find_partial(texts, postings)
+        return count_hits(result, partial)
+
+    def load_heads(self, texts):
+        """
+        return {text: postings or the header of pages},
+        or None when any of them is not in the index.
+        """
+        reader = self.reader
+        if reader.segment or reader.buckets or reader.binary:
+            return self.load_keys(texts)  # never paged
+        bag = {}
+        for text in set(texts):
+            bag[text] = reader.read_head(text)
+            if bag[text] is None:
+                return None
+        return bag
+
+    def search_pages(self, texts, heads, partial, limit, result, offsets=None):
+        """
+        search on paged key files, a page of the least frequent key at a time.
+        documents of the page are looked up in the pages of other keys
+        by the ranges of doc ids in their headers.
+        """
+        reader = self.reader
+        if reader.docs is None:
+            reader.read_docs()
+        ids = dict((path, i) for i, path in enumerate(reader.docs))
+        size = lambda t: heads[t]['total'] if is_paged(heads[t]) else len(heads[t])
+        driver = min(set(texts), key=size)
+        rounds = len(heads[driver]['pages']) if is_paged(heads[driver]) else 1
+        loaded = {}
+
+        def load_page(text, page):
+            if (text, page) not in loaded:
+                loaded[(text, page)] = reader.read_page(text, page)
+            return loaded[(text, page)]
+
+        for r in range(rounds):
+            if is_paged(heads[driver]):
+                docs = set(ids[x[0]] for x in load_page(driver, r))
+            else:
+                docs = set(ids[x[0]] for x in heads[driver])
+            sorted_docs = sorted(docs)
+            postings = {}
+            for text in set(texts):
+                head = heads[text]
+                if not is_paged(head):
+                    bag = head
+                else:
+                    bag = []
+                    for page, (count, first, last) in enumerate(head['pages']):
+                        i = bisect_left(sorted_docs, first)
+                        if i < len(sorted_docs) and sorted_docs[i] <= last:
+                            bag.extend(load_page(text, page))
+                postings[text] = [x for x in bag if ids[x[0]] in docs]
+            result['perfection'].update(find_perfection(texts, postings, offsets))
+            if partial:
+                result['found'].update(find_partial(texts, postings))
+            if len(result['perfection']) >= limit:
+                result['more'] = r + 1 < rounds
+                break
+
+def plan_cover(texts, n, count=None):
+    """
+    offsets of the fewest N-grams of texts covering the query,
+    where texts[i] is the N-gram at i of size n, as generate_texts gives.
+    perfect matches of them are those of every N-gram,
+    since every character of the query is checked by one of them.
+    count: number of postings of a text, to take the rarest ones among covers
+           of the fewest N-grams, or None to take any of them.
+    """
+    m = len(texts)
+    if m <= 2:
+        return list(range(m))
+    weights = [count(text) for text in texts] if count else [0] * m
+    best = [(1, weights[0], -1)]  # (N-grams, postings, previous) of covers ending at i
+    for i in range(1, m):
+        best.append(min((best[j][0] + 1, best[j][1] + weights[i], j)
+                        for j in range(max(0, i - n), i)))
+    offsets = []
+    i = m - 1
+    while i >= 0:
+        offsets.append(i)
+        i = best[i][2]
+    return offsets[::-1]
+
+def count_hits(result, partial):
+    """
+    fill hits of result, as [hits, docs] of perfection and found.
+    """
+    result['hits']['perfection'] = [
+        sum(len(x) for x in result['perfection'].values()),
+        len(result['perfection'])]
+    if partial:
+        result['hits']['found'] = [
+            sum(len(x) for x in result['found'].values()),
+            len(result['found'])]
+    return result
+
+def group_by_doc(postings, docs=None):
+    """
+    return {doc: sorted unique positions} of postings,
+    restricted to docs when given.
+    """
+    bag = {}
+    for doc, pos in postings:
+        if docs is not None and doc not in docs:
+            continue
+        if doc in bag:
+            bag[doc].append(pos)
+        else:
+            bag[doc] = [pos]
+    for doc in bag:
+        bag[doc] = sorted(set(bag[doc]))
+    return bag
+
+def gallop(a, x, lo=0):
+    """
+    index of the first item >= x in sorted list a, searching from lo.
+    steps grow exponentially, so that near targets are found quickly.
+    """
+    n = len(a)
+    step = 1
+    hi = lo
+    while hi < n and a[hi] < x:
+        lo = hi + 1
+        hi = lo + step
+        step *= 2
+    return bisect_left(a, x, lo, min(hi, n))
+
+def find_perfection(texts, postings, offsets=None):
+    """
+    pick up perfect matches: documents having texts[j] at p + offsets[j] for all j.
+    texts: N-gram keyword texts
+    postings: {text: [[doc, pos], ...]}
+    offsets: positions of texts in the query, 0, 1, 2, ... by default,
+             such as of a cover by plan_cover.
+    """
+    if offsets is None:
+        offsets = list(range(len(texts)))
+    rank = sorted(set(texts), key=lambda t: len(postings[t]))
+    groups = {}
+    docs = None
+    for t in rank:  # rarest first, so the candidate set shrinks fast.
+        groups[t] = group_by_doc(postings[t], docs)
+        docs = set(groups[t])
+        if not docs:
+            return {}
+
+    first = rank[0]
+    index = texts.index(first)
+    offset = offsets[index]
+    order = sorted((j for j in range(len(texts)) if j != index),
+                   key=lambda j: len(postings[texts[j]]))
+    bag = {}
+    for x in postings[texts[0]]:  # keep the document order of JsNgram.js
+        doc = x[0]
+        if doc not in docs or doc in bag:
+            continue
+        checks = [groups[texts[j]][doc] for j in order]
+        starts = [0] * len(checks)
+        hits = []
+        for pos in groups[first][doc]:
+            p = pos - offset
+            for c, j in enumerate(order):
+                a = checks[c]
+                q = p + offsets[j]
+                i = gallop(a, q, starts[c])
+                starts[c] = i
+                if i == len(a) or a[i] != q:
+                    break
+            else:
+                hits.append([p])
+        bag[doc] = hits
+    return dict((doc, hits) for doc, hits in bag.items() if hits)
+
+def find_partial(texts, postings):
+    """
+    gather every occurrence of texts by document, sorted by position,
+    as same as sortFoundByDocumentPosition.
+    """
+    bag = {}
+    for text in texts:
+        for doc, pos in postings[text]:
+            if doc in bag:
+                bag[doc].append([pos, text])
+            else:
+                bag[doc] = [[pos, text]]
+    for doc in bag:
+        bag[doc].sort()
+    return bag
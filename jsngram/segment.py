@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# written for python 3 but also run on python 2
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+"""
+jsngram package:
+  Simple N-gram full text search engine on JavaScript and Python.
+  https://github.com/sukuba/js-py-ngram-full-text-search
+jsngram.segment:
+  packed single file index, instead of a file per key.
+
+layout:
+  header: magic, version, key width, number of keys,
+          offsets of the directory, document table and postings
+  directory: sorted entries of fixed size
+             key in utf-32-be padded to key width, postings offset, length
+  document table: json list of paths
+  postings: bin2 encoded postings of each key
+
+the directory is read through mmap and searched by bisection,
+so opening a segment does not read postings at all.
+"""
+
+import os
+import json
+import codecs
+import mmap
+import struct
+
+from . import bin2
+from . import dir2
+
+magic = b'JSNG'
+version = 1
+header = struct.Struct(str('<4sHHIQQQQ'))
+# magic, version, key width, number of keys,
+# directory offset, docs offset, docs length, postings offset
+entry_tail = struct.Struct(str('<QI'))  # postings offset, length
+
+def encode_key(key, width):
+    """
+    fixed size bytes of key, sorting in the same order as the key.
+    """
+    return (key + '\0' * (width - len(key))).encode('utf-32-be')
+
+def write_segment(file_name, docs, db, verbose=False):
+    """
+    pack postings into a segment file.
+    docs: document table, path by doc id.
+    db: {key: flat sequence of doc id, start pairs}, as JsNgram.db.
+    """
+    width = max(len(key) for key in db) if db else 1
+    keys = sorted(db.keys(), key=lambda k: encode_key(k, width))
+    entry_size = width * 4 + entry_tail.size
+    docs_data = json.dumps(docs, ensure_ascii=False).encode('utf-8')
+    dir_offset = header.size
+    docs_offset = dir_offset + entry_size * len(keys)
+    data_offset = docs_offset + len(docs_data)
+
+    dir2.ensure_dir(file_name)
+    with open(file_name, 'wb') as outfile:
+        outfile.write(header.pack(magic, version, width, len(keys), dir_offset,
+                                  docs_offset, len(docs_data), data_offset))
+        outfile.seek(docs_offset)
+        outfile.write(docs_data)
+        directory = bytearray()
+        offset = 0
+        for key in keys:
+            data = bin2.encode_postings(db[key])
+            outfile.write(data)
+            directory += encode_key(key, width)
+            directory += entry_tail.pack(offset, len(data))
+            offset += len(data)
+        outfile.seek(dir_offset)
+        outfile.write(directory)
+    if verbose:
+        print(file_name, len(keys), data_offset + offset)
+
+class JsNgramSegment(object):
+    """
+    N-gram index reader on a segment file.
+    """
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.file = open(file_name, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        (tag, ver, self.width, self.n_keys, self.dir_offset, docs_offset,
+         docs_length, self.data_offset) = header.unpack(self.map[:header.size])
+        if tag != magic or ver != version:
+            raise ValueError('not a segment file: %s' % file_name)
+        self.key_size = self.width * 4
+        self.entry_size = self.key_size + entry_tail.size
+        self.docs = json.loads(self.map[docs_offset:docs_offset+docs_length].decode('utf-8'))
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def entry_key(self, i):
+        pos = self.dir_offset + self.entry_size * i
+        return self.map[pos:pos+self.key_size]
+
+    def entry(self, i):
+        pos = self.dir_offset + self.entry_size * i + self.key_size
+        return entry_tail.unpack(self.map[pos:pos+entry_tail.size])
+
+    def keys(self):
+        for i in range(self.n_keys):
+            yield self.entry_key(i).decode('utf-32-be').rstrip('\0')
+
+    def find(self, key):
+        """
+        return directory index of key by bisection, or None when not found.
+        """
+        if len(key) > self.width:
+            return None
+        target = encode_key(key, self.width)
+        lo = 0
+        hi = self.n_keys
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.entry_key(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.n_keys and self.entry_key(lo) == target:
+            return lo
+        return None
+
+    def read_entry(self, i, docs=True):
+        offset, length = self.entry(i)
+        start = self.data_offset + offset
+        return bin2.decode_postings(self.map[start:start+length],
+                                    self.docs if docs else None)
+
+    def read_key(self, key):
+        """
+        postings of key as a list of [path, start], or None when not found.
+        """
+        i = self.find(key)
+        if i is None:
+            return None
+        return self.read_entry(i)
+
+    def export_json(self, dest, flat=False, verbose=False):
+        """
+        write the per key json file tree, as same as JsNgram.to_json.
+        """
+        from .jsngram import key_file_name
+        for i, key in enumerate(self.keys()):
+            file_name = os.path.join(dest, key_file_name(key, flat))
+            if verbose:
+                print(file_name)
+            dir2.ensure_dir(file_name)
+            with codecs.open(file_name, 'w', 'utf-8') as outfile:
+                json.dump(self.read_entry(i), outfile, ensure_ascii=False)
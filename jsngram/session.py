@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# written for python 3 but also run on python 2
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+"""
+jsngram package:
+  Simple N-gram full text search engine on JavaScript and Python.
+  https://github.com/sukuba/js-py-ngram-full-text-search
+jsngram.session:
+  batched index builder keeping key files open between batches.
+
+  begin(), add_files(batch) as many times as needed, then finish().
+  output is the same as add_files_to_json for each batch,
+  followed by json_end on every file, but
+  hot key files stay open in an LRU pool of buffered handles,
+  and finish() puts the end brackets on the files it created,
+  without listing the tree again.
+
+example:
+  session = JsNgramSession(2, True, 'txt', 'idx')
+  session.begin()
+  for batch in batches:
+      session.add_files(batch)
+  files = session.finish()
+"""
+
+import os
+import json
+from timeit import default_timer as clock
+from collections import OrderedDict
+
+from . import dir2
+from . import json2
+from .jsngram import JsNgram, key_file_name
+
+class JsNgramSession(object):
+    """
+    N-gram index builder writing json files batch by batch.
+    max_open: number of key files kept open at most.
+    normalize: see JsNgram.
+    """
+    def __init__(self, n=2, shorter=True, src='.', dest='.', flat=False,
+                 ignore=r'[\s,.，．、。]+', max_open=256, normalize=False):
+        self.ix = JsNgram(n, shorter, src, dest, flat, ignore, normalize)
+        self.max_open = max_open
+        self.handles = OrderedDict()
+        self.created = {}
+        self.dirs = set()
+
+    def begin(self):
+        self.close_all()
+        self.ix.remove_key_stats()
+        self.created = {}
+        self.dirs = set()
+
+    def open(self, file_name):
+        """
+        return an open handle of file_name, most recently used at last.
+        the least recently used one is closed when the pool is full.
+        """
+        handle = self.handles.pop(file_name, None)
+        if handle is None:
+            if len(self.handles) >= self.max_open:
+                self.handles.popitem(last=False)[1].close()
+            if file_name in self.created:
+                handle = open(file_name, 'ab')
+            else:
+                path = os.path.dirname(file_name)
+                if path not in self.dirs:
+                    dir2.ensure_dirs([path])
+                    self.dirs.add(path)
+                handle = open(file_name, 'wb')  # overwrite a stale one
+                json2.remove_gzip(file_name)
+        self.handles[file_name] = handle
+        return handle
+
+    def add_files(self, paths, verbose=False, processes=1):
+        """
+        index a batch of files and append their postings to key files.
+        return the number of keys in the batch.
+        """
+        ix = self.ix
+        ix.clear()
+        ix.add_files(paths, verbose, processes)
+        docs_json = [json.dumps(path, ensure_ascii=False) for path in ix.docs]
+        sep = json2.new_line + json2.delimiter2
+        for key, postings in ix.db.items():
+            file_name = os.path.join(ix.dest, key_file_name(key, ix.flat))
+            is_new = file_name not in self.created
+            handle = self.open(file_name)
+            self.created[file_name] = True
+            it = iter(postings)
+            dump = sep.join(['[%s, %d]' % (docs_json[i], start) for i, start in zip(it, it)])
+            head = json2.start_tag + json2.new_line + json2.delimiter1 if is_new else sep
+            handle.write((head + dump).encode('utf-8'))
+        n = len(ix.db)
+        ix.clear()
+        return n
+
+    def finish(self, verbose=False, gzip_level=0, gzip_min_size=1024):
+        """
+        put the end bracket on every file created, and close them.
+        gzip_level: 1 to 9 to write gzip siblings as json2.json_end does,
+                    accounted in stats of the index as JsNgram.to_json does.
+        return the list of file names.
+        """
+        end = (json2.new_line + json2.end_tag).encode('utf-8')
+        stats = self.ix.stats
+        for file_name in self.created:
+            handle = self.handles.pop(file_name, None)
+            if handle is None:
+                handle = open(file_name, 'ab')
+            with handle:
+                handle.write(end)
+            if gzip_level:
+                start_time = clock()
+                size = json2.gzip_file(file_name, gzip_level, gzip_min_size)
+                if stats is not None and size is not None:
+                    stats.add_gzip(os.path.getsize(file_name), size, clock() - start_time)
+            if verbose:
+                print(file_name)
+        files = list(self.created.keys())
+        self.created = {}
+        return files
+
+    def close_all(self):
+        while self.handles:
+            self.handles.popitem()[1].close()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# written for python 3 but also run on python 2
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+"""
+jsngram package:
+  Simple N-gram full text search engine on JavaScript and Python.
+  https://github.com/sukuba/js-py-ngram-full-text-search
+jsngram.sorter:
+  External sort-merge index builder with a memory budget.
+
+  postings are collected in memory until the budget is reached,
+  then spilled to a temporary run file sorted by key.
+  finish() merges all runs key by key and writes each json file at once,
+  with the end bracket, so no json_append or json_end pass is needed.
+"""
+
+import os
+import struct
+import shutil
+import tempfile
+import heapq
+import itertools
+from array import array
+
+from . import dir2
+from . import json2
+from .jsngram import JsNgram, key_file_name, posting_type
+
+run_header = struct.Struct(str('<HI'))  # key length in bytes, posting items
+key_overhead = 160  # rough bytes of a dict entry, a key and an empty array
+
+class JsNgramSorter(object):
+    """
+    N-gram index builder spilling sorted runs to temporary files.
+    budget: approximate bytes of postings to keep in memory.
+    tmp: directory for run files, system default when None.
+    normalize: see JsNgram.
+    """
+    def __init__(self, n=2, shorter=True, src='.', dest='.', flat=False,
+                 ignore=r'[\s,.，．、。]+', budget=64*1024*1024, tmp=None,
+                 normalize=False):
+        self.ix = JsNgram(n, shorter, src, dest, flat, ignore, normalize)
+        self.budget = budget
+        self.tmp = tmp
+        self.work_dir = None
+        self.runs = []
+        self.used = 0
+        self.grams = n if self.ix.shorter else 1
+        self.item_size = array(posting_type).itemsize
+
+    def add_document(self, path, content):
+        self.ix.add_document(path, content)
+        # upper bound: every character starts a gram of each length.
+        self.used += len(content) * self.grams * 2 * self.item_size
+        if self.used + len(self.ix.db) * key_overhead >= self.budget:
+            self.spill()
+
+    def add_file(self, path, verbose=False):
+        file_name = os.path.join(self.ix.src, path)
+        if verbose:
+            print(file_name)
+        self.add_document(path, self.ix.read_source(path))
+
+    def add_files(self, paths, verbose=False):
+        for path in paths:
+            self.add_file(path, verbose)
+
+    def spill(self):
+        """
+        write postings in memory to a new run file sorted by key.
+        doc ids stay in self.ix.docs, so runs only hold integers.
+        """
+        db = self.ix.db
+        if not db:
+            return
+        if not self.work_dir:
+            self.work_dir = tempfile.mkdtemp(prefix='jsngram-', dir=self.tmp)
+        run_name = os.path.join(self.work_dir, '%06d.run' % len(self.runs))
+        with open(run_name, 'wb') as outfile:
+            for key in sorted(db.keys()):
+                postings = db[key]
+                bkey = key.encode('utf-8')
+                outfile.write(run_header.pack(len(bkey), len(postings)))
+                outfile.write(bkey)
+                postings.tofile(outfile)
+        self.runs.append(run_name)
+        self.ix.db = {}
+        self.used = 0
+
+    def finish(self, verbose=False):
+        """
+        merge runs and postings in memory into json files in dest.
+        return the list of written file names.
+        """
+        self.ix.remove_key_stats()
+        db = self.ix.db
+        sources = [read_run(run, i) for i, run in enumerate(self.runs)]
+        sources.append(((key, len(self.runs), db[key]) for key in sorted(db.keys())))
+        # same key comes in the order of runs, keeping postings in input order.
+        merged = heapq.merge(*sources)
+
+        docs = self.ix.docs
+        files = []
+        try:
+            for key, group in itertools.groupby(merged, lambda x: x[0]):
+                postings = array(posting_type)
+                for x in group:
+                    postings.extend(x[2])
+                it = iter(postings)
+                data = [[docs[i], start] for i, start in zip(it, it)]
+                file_name = os.path.join(self.ix.dest, key_file_name(key, self.ix.flat))
+                if verbose:
+                    print(file_name)
+                dir2.ensure_dir(file_name)
+                json2.json_write(file_name, data)
+                files.append(file_name)
+        finally:
+            self.cleanup()
+        return files
+
+    def cleanup(self):
+        if self.work_dir:
+            shutil.rmtree(self.work_dir, True)
+        self.work_dir = None
+        self.runs = []
+        self.ix.db = {}
+        self.used = 0
+
+def read_run(run_name, run_no):
+    """
+    iterate (key, run_no, postings) in a run file.
+    """
+    with open(run_name, 'rb') as infile:
+        while True:
+            header = infile.read(run_header.size)
+            if not header:
+                break
+            n_key, n_postings = run_header.unpack(header)
+            key = infile.read(n_key).decode('utf-8')
+            postings = array(posting_type)
+            postings.fromfile(infile, n_postings)
+            yield key, run_no, postings
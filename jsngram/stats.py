@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# written for python 3 but also run on python 2
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+"""
+jsngram package:
+  Simple N-gram full text search engine on JavaScript and Python.
+  https://github.com/sukuba/js-py-ngram-full-text-search
+jsngram.stats:
+  build instrumentation, timers and counters of JsNgram.
+
+  phases: seconds spent in each phase of a build
+    read: reading text files
+    normalize: normalizing text
+    tokenize: splitting text and making postings
+    serialize: making file contents from postings
+    write: writing files
+  counters: documents, characters, keys, postings,
+            bytes_written and files_created,
+            gzip_files, gzip_source_bytes and gzip_bytes of gzip siblings
+
+  JsNgram does nothing of these while its stats is None (the default),
+  but checking it once per document or file.
+  a progress callback is called as progress(stage, done, total),
+  where total is None when not known.
+
+example:
+  stats = JsNgramStats(progress=lambda stage, done, total: print(stage, done, total))
+  ix = JsNgram(2, True, 'txt', 'idx')
+  ix.stats = stats
+  with stats.capture(profile=True, memory=True):
+      ix.add_files(paths)
+      ix.to_json()
+  stats.write_report('stats.json')
+"""
+
+import json
+import codecs
+import threading
+import contextlib
+from timeit import default_timer as clock
+from collections import OrderedDict
+
+from . import dir2
+
+phases = ('read', 'normalize', 'tokenize', 'serialize', 'write')
+counters = ('documents', 'characters', 'keys', 'postings',
+            'bytes_written', 'files_created',
+            'gzip_files', 'gzip_source_bytes', 'gzip_bytes')
+
+class JsNgramStats(object):
+    """
+    timers and counters of a build.
+    progress: callback of progress(stage, done, total), or None.
+    """
+    def __init__(self, progress=None):
+        self.progress = progress
+        self.lock = threading.Lock()  # writers count on threads
+        self.clear()
+
+    def clear(self):
+        self.times = OrderedDict((phase, 0.0) for phase in phases)
+        self.counts = OrderedDict((name, 0) for name in counters)
+        self.started = clock()
+        self.memory = None
+        self.profile = None
+
+    def add_time(self, phase, seconds):
+        with self.lock:
+            self.times[phase] += seconds
+
+    def count(self, name, x=1):
+        with self.lock:
+            self.counts[name] += x
+
+    def add_file(self, keys, postings, size, serialize, write, created=True):
+        """
+        account a file written: keys and postings in it, bytes,
+        and seconds to serialize and to write it.
+        created: False when appended to an existing file.
+        """
+        with self.lock:
+            self.counts['keys'] += keys
+            self.counts['postings'] += postings
+            self.counts['bytes_written'] += size
+            self.counts['files_created'] += 1 if created else 0
+            self.times['serialize'] += serialize
+            self.times['write'] += write
+
+    def add_gzip(self, source_size, size, seconds):
+        """
+        account a gzip sibling of size bytes, made of source_size bytes.
+        """
+        with self.lock:
+            self.counts['gzip_files'] += 1
+            self.counts['gzip_source_bytes'] += source_size
+            self.counts['gzip_bytes'] += size
+            self.times['write'] += seconds
+
+    @contextlib.contextmanager
+    def timer(self, phase):
+        start = clock()
+        try:
+            yield
+        finally:
+            self.add_time(phase, clock() - start)
+
+    def notify(self, stage, done, total=None):
+        if self.progress is not None:
+            self.progress(stage, done, total)
+
+    @contextlib.contextmanager
+    def capture(self, profile=False, memory=False, top=20, profile_file=None):
+        """
+        run the block under cProfile and/or tracemalloc.
+        profile: keep the top functions by cumulative time in the report,
+                 and dump all of them to profile_file when given.
+        memory: keep the peak of memory allocated in the report (python 3).
+        """
+        profiler = None
+        tracing = False
+        if profile:
+            import cProfile
+            profiler = cProfile.Profile()
+        if memory:
+            try:
+                import tracemalloc
+                tracemalloc.start()
+                tracing = True
+            except ImportError:
+                pass
+        if profiler:
+            profiler.enable()
+        try:
+            yield self
+        finally:
+            if profiler:
+                profiler.disable()
+                self.profile = profile_rows(profiler, top)
+                if profile_file:
+                    profiler.dump_stats(profile_file)
+            if tracing:
+                current, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                self.memory = {'current': current, 'peak': peak}
+
+    def report(self):
+        """
+        return the stats as a dict ready for json.
+        """
+        elapsed = clock() - self.started
+        bag = OrderedDict()
+        bag['elapsed'] = elapsed
+        bag['phases'] = OrderedDict(self.times)
+        bag['counters'] = OrderedDict(self.counts)
+        tokenize = self.times['tokenize']
+        write = self.times['serialize'] + self.times['write']
+        bag['rates'] = OrderedDict([
+            ('characters_per_second', self.counts['characters'] / tokenize if tokenize else None),
+            ('bytes_per_second', self.counts['bytes_written'] / write if write else None),
+            ('files_per_second', self.counts['files_created'] / write if write else None)])
+        if self.counts['gzip_source_bytes']:
+            # compressed size to the source size of the files compressed.
+            bag['rates']['gzip_ratio'] = self.counts['gzip_bytes'] / self.counts['gzip_source_bytes']
+        if self.memory is not None:
+            bag['memory'] = self.memory
+        if self.profile is not None:
+            bag['profile'] = self.profile
+        return bag
+
+    def write_report(self, file_name):
+        dir2.ensure_dir(file_name)
+        with codecs.open(file_name, 'w', 'utf-8') as outfile:
+            json.dump(self.report(), outfile, ensure_ascii=False, indent=1)
+
+def profile_rows(profiler, top=20):
+    """
+    top functions of a cProfile.Profile by cumulative time,
+    as a list of [function, calls, total seconds, cumulative seconds].
+    """
+    import pstats
+    rows = []
+    for (file_name, line, name), (cc, nc, tt, ct, callers) in pstats.Stats(profiler).stats.items():
+        rows.append(['%s:%d(%s)' % (file_name, line, name), nc, tt, ct])
+    rows.sort(key=lambda row: row[3], reverse=True)
+    return rows[:top]
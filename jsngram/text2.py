@@ -12,8 +12,14 @@ jsngram.text2:
 """
 
 import os
+import re
 import codecs
+import stat
+import hashlib
+import tempfile
 import unicodedata
+import multiprocessing
+from collections import OrderedDict
 
 if __name__ == '__main__':
     import dir2
@@ -26,6 +32,44 @@ def normal_text(text):
     """
     return unicodedata.normalize('NFKC', text)
 
+safe_split_re = re.compile(r'[\x00-\x7f][^\x00-\x7f]*\Z')
+# text may be normalized in parts split before an ascii character,
+# that never composes with the one before nor reorders with marks.
+
+class NormalReader(object):
+    """
+    text stream normalized part by part, giving read() as infile does.
+    each part is cut before the last ascii character read so far,
+    and the rest is carried to the next one,
+    so the text comes out the same as normalizer on the whole of it,
+    for NFKC and normalizers of the same nature.
+    """
+    def __init__(self, infile, normalizer=normal_text):
+        self.infile = infile
+        self.normalizer = normalizer
+        self.carry = ''
+        
+    def read(self, size=-1):
+        """
+        return the next part normalized, or '' at the end only.
+        a part is longer than size when no ascii character is found in it,
+        or when the normalizer deletes the whole of what is read.
+        """
+        text = self.carry
+        while True:
+            chunk = self.infile.read(size)
+            if not chunk:
+                self.carry = ''
+                return self.normalizer(text) if text else text
+            text += chunk
+            split = safe_split_re.search(text)
+            if split and split.start() > 0:
+                part = self.normalizer(text[:split.start()])
+                text = text[split.start():]
+                if part:
+                    self.carry = text
+                    return part
+
 def normalize_texts(src, dest=None):
     """
     normalize text files at src to dest.
@@ -52,6 +96,124 @@ def normalize_texts(src, dest=None):
             nextdest = os.path.join(dest, entry) if dest else None
             normalize_texts(nextpath, nextdest)
     
+replace_file = getattr(os, 'replace', os.rename)  # python 2 has no os.replace
+
+def scan_texts(src, dest=None):
+    """
+    yield (source, destination, mtime of source) of files at src,
+    in the same way as normalize_texts, but walking by dir2.iter_files.
+    """
+    if os.path.isfile(src):
+        yield src, dest, os.stat(src).st_mtime
+        return
+    for path in dir2.iter_files(src):
+        parts = path.split('/')
+        src_file = os.path.join(src, *parts)
+        nextdest = os.path.join(dest, *parts) if dest else None
+        yield src_file, nextdest, os.stat(src_file).st_mtime
+
+def new_file_mode():
+    """
+    permission bits of a new file by the umask, as open() gives.
+    """
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+def write_atomic(file_name, data):
+    """
+    write bytes to a temporary dot file beside file_name, then replace it,
+    so that file_name is never seen half written.
+    file_name keeps its permissions, or gets those of a new file,
+    not 0600 of the temporary file.
+    """
+    dir2.ensure_dir(file_name)
+    if os.path.exists(file_name):
+        mode = stat.S_IMODE(os.stat(file_name).st_mode)
+    else:
+        mode = new_file_mode()
+    fd, temp_name = tempfile.mkstemp(suffix='.tmp', prefix='.',
+                                     dir=os.path.dirname(file_name) or '.')
+    try:
+        with os.fdopen(fd, 'wb') as outfile:
+            outfile.write(data)
+        os.chmod(temp_name, mode)
+        replace_file(temp_name, file_name)
+    except:
+        os.remove(temp_name)
+        raise
+
+def normalize_file(task):
+    """
+    normalize a file of task (source, destination, normalizer),
+    writing the destination unless it has the same hash already.
+    return (source, number of bytes written or None when unchanged).
+    """
+    src, dest, normalizer = task
+    with codecs.open(src, 'r', 'utf-8') as infile:
+        data = normalizer(infile.read()).encode('utf-8')
+    if os.path.exists(dest):
+        with open(dest, 'rb') as infile:
+            old = hashlib.sha1(infile.read()).digest()
+        if old == hashlib.sha1(data).digest():
+            if dest != src:
+                os.utime(dest, None)  # newer than src, not to be read again
+            return src, None
+    write_atomic(dest, data)
+    return src, len(data)
+
+def normalize_all(src, dest=None, processes=None, normalizer=normal_text,
+                  force=False, verbose=False):
+    """
+    normalize text files at src to dest, as normalize_texts does, in bulk.
+    a file is skipped when its destination is newer than it (unless force),
+    and left as it is when normalized to the same contents.
+    files are normalized on a process pool of processes (None for all cpus),
+    and written atomically.
+    normalizer: a function at module level when processes > 1.
+    return {'processed': files normalized, 'written': files written,
+            'unchanged': files not written for the same contents,
+            'skipped': files not read for the newer destination,
+            'bytes_written': bytes of files written}.
+    """
+    summary = OrderedDict([('processed', 0), ('written', 0), ('unchanged', 0),
+                           ('skipped', 0), ('bytes_written', 0)])
+    
+    def tasks():
+        for src_file, dest_file, mtime in scan_texts(src, dest):
+            if dest_file is None:
+                dest_file = src_file
+            elif not force:
+                try:
+                    if os.stat(dest_file).st_mtime >= mtime:
+                        summary['skipped'] += 1
+                        continue
+                except OSError:
+                    pass  # no destination yet
+            yield src_file, dest_file, normalizer
+    
+    if processes == 1:
+        pool = None
+        results = map(normalize_file, tasks())
+    else:
+        pool = multiprocessing.Pool(processes)
+        results = pool.imap_unordered(normalize_file, tasks(), 16)
+    try:
+        for src_file, size in results:
+            if verbose:
+                print(src_file)
+            summary['processed'] += 1
+            if size is None:
+                summary['unchanged'] += 1
+            else:
+                summary['written'] += 1
+                summary['bytes_written'] += size
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+    return summary
+    
 
 def test():
     base_dir = os.path.realpath('/scratch') # may be './scratch', or others.
@@ -83,9 +245,61 @@ def test():
         res = b == an
         print('[%s]: text should be normalized.  normalize_texts2' % 'OK' if res else 'NG')
         
+    def test_normal_reader1():
+        import io
+        b = u'ｶﾞｷﾞ ｸﾞ\r\nAe\u0301ｹﾞ' * 5
+        res = True
+        for size in (1, 2, 3, 7, 100):
+            reader = NormalReader(io.StringIO(b))
+            parts = []
+            while True:
+                part = reader.read(size)
+                if not part:
+                    break
+                parts.append(part)
+            res = res and ''.join(parts) == normal_text(b)
+        print('[%s]: text should be normalized by parts.  normal_reader1' % ('OK' if res else 'NG'))
+        
+    def test_normalize_all1():
+        import shutil
+        src = os.path.join(base_dir, 'norm-src')
+        dest = os.path.join(base_dir, 'norm-dest')
+        for path in (src, dest):
+            if os.path.exists(path):
+                shutil.rmtree(path)
+        for i in range(5):
+            file_name = os.path.join(src, 'd%d' % (i % 2), '%d.txt' % i)
+            dir2.ensure_dir(file_name)
+            with codecs.open(file_name, 'w', 'utf-8') as outfile:
+                outfile.write(a * (i + 1))
+        with codecs.open(os.path.join(src, '.dot.txt'), 'w', 'utf-8') as outfile:
+            outfile.write(a)
+        first = normalize_all(src, dest, 2)
+        second = normalize_all(src, dest, 2)
+        old = os.stat(os.path.join(src, 'd0', '0.txt')).st_mtime
+        os.utime(os.path.join(src, 'd0', '0.txt'), (old + 10, old + 10))
+        third = normalize_all(src, dest, 1)
+        with codecs.open(os.path.join(dest, 'd1', '3.txt'), 'r', 'utf-8') as infile:
+            b = infile.read()
+        mode = stat.S_IMODE(os.stat(os.path.join(dest, 'd1', '3.txt')).st_mode)
+        os.chmod(os.path.join(src, 'd0', '0.txt'), 0o640)
+        normalize_all(src, None, 1, force=True)
+        kept = stat.S_IMODE(os.stat(os.path.join(src, 'd0', '0.txt')).st_mode)
+        res = (b == an * 4 and first['written'] == 5 and
+               first['bytes_written'] == sum(len((an * (i + 1)).encode('utf-8')) for i in range(5)) and
+               second['skipped'] == 5 and second['processed'] == 0 and
+               third['processed'] == 1 and third['unchanged'] == 1 and third['skipped'] == 4 and
+               sorted(dir2.list_files(dest)) == sorted(dir2.list_files(src)) and
+               mode == new_file_mode() and kept == 0o640)
+        for path in (src, dest):
+            shutil.rmtree(path)
+        print('[%s]: texts should be normalized when changed.  normalize_all1' % ('OK' if res else 'NG'))
+        
     test_normal_text1()
     test_normalize_texts1()
     test_normalize_texts2()
+    test_normal_reader1()
+    test_normalize_all1()
 
 if __name__ == '__main__':
     test()
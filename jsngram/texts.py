@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# written for python 3 but also run on python 2
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+"""
+jsngram package:
+  Simple N-gram full text search engine on JavaScript and Python.
+  https://github.com/sukuba/js-py-ngram-full-text-search
+jsngram.texts:
+  text store of documents cut into fixed size chunks,
+  so that a preview around a hit is read without the whole document.
+
+layout, in texts/ of the index by default:
+  table.json: {"chunk_size": characters per chunk,
+               "header": column headers of the result, or null,
+               "docs": {path: {"id": doc id, "length": characters,
+                               "title": title, ...more info}}}
+  <doc id>/<chunk>.txt: utf-8 text of characters
+                        from chunk * chunk_size to (chunk + 1) * chunk_size
+
+positions are those of the index, characters of the text as indexed.
+the table is in the form of JsNgram.titleInfo of the client,
+so that titles and the header come from the same file.
+"""
+
+import os
+import io
+import json
+import codecs
+from collections import OrderedDict
+
+from . import dir2
+
+store_name = 'texts'  # directory of the store in dest of JsNgram.to_texts
+table_name = 'table.json'
+chunk_name = '%d/%d.txt'
+title_size = 80
+
+def chunk_file_name(doc, chunk):
+    return chunk_name % (doc, chunk)
+
+def make_title(content, size=title_size):
+    """
+    the first line of content that is not blank, cut to size characters.
+    """
+    for line in content.splitlines():
+        line = line.strip()
+        if line:
+            return line[:size]
+    return ''
+
+def snippet_range(at, hi_len, out_len):
+    """
+    (start, end) of the preview of hi_len characters at,
+    out_len characters long as makeTextHilighted of the client.
+    """
+    start = max(0, at - (out_len - hi_len) // 2)
+    return start, start + out_len
+
+def write_texts(docs, dest, chunk_size=1024, titles=None, header=None, verbose=False):
+    """
+    write the text store of docs in dest, and return the table.
+    docs: iterable of (doc id, path, content).
+    titles: {path: title or dict of document info}, to override the first line.
+    header: list of column headers of the result.
+    """
+    table = OrderedDict([('chunk_size', chunk_size), ('header', header),
+                         ('docs', OrderedDict())])
+    titles = titles or {}
+    for doc, path, content in docs:
+        info = OrderedDict([('id', doc), ('length', len(content)),
+                            ('title', make_title(content) or path)])
+        extra = titles.get(path)
+        if isinstance(extra, dict):
+            info.update(extra)
+        elif extra is not None:
+            info['title'] = extra
+        table['docs'][path] = info
+        for chunk, start in enumerate(range(0, len(content), chunk_size)):
+            file_name = os.path.join(dest, chunk_file_name(doc, chunk))
+            if chunk == 0:
+                dir2.ensure_dir(file_name)
+            if verbose:
+                print(file_name)
+            with open(file_name, 'wb') as outfile:
+                outfile.write(content[start:start+chunk_size].encode('utf-8'))
+    file_name = os.path.join(dest, table_name)
+    dir2.ensure_dir(file_name)
+    with codecs.open(file_name, 'w', 'utf-8') as outfile:
+        json.dump(table, outfile, ensure_ascii=False)
+    return table
+
+class JsNgramTexts(object):
+    """
+    reader of a text store written by write_texts.
+    """
+    def __init__(self, src='.'):
+        self.src = src
+        with codecs.open(os.path.join(src, table_name), 'r', 'utf-8') as infile:
+            self.table = json.load(infile, object_pairs_hook=OrderedDict)
+        self.chunk_size = self.table['chunk_size']
+        self.docs = self.table['docs']
+
+    def title(self, path):
+        return self.docs[path]['title']
+
+    def read_chunk(self, doc, chunk):
+        file_name = os.path.join(self.src, chunk_file_name(doc, chunk))
+        with io.open(file_name, 'r', encoding='utf-8', newline='') as infile:
+            return infile.read()
+
+    def read_text(self, path, start=0, end=None):
+        """
+        characters from start to end of a document, reading the chunks in it only.
+        """
+        info = self.docs[path]
+        end = info['length'] if end is None else min(end, info['length'])
+        if start >= end:
+            return ''
+        size = self.chunk_size
+        first = start // size
+        text = ''.join(self.read_chunk(info['id'], chunk)
+                       for chunk in range(first, (end - 1) // size + 1))
+        return text[start - first * size:end - first * size]
+
+    def snippet(self, path, at, hi_len, out_len=240):
+        """
+        (start, text) of the preview of a hit, see snippet_range.
+        """
+        start, end = snippet_range(at, hi_len, out_len)
+        return start, self.read_text(path, start, end)
+
+def test():
+    import shutil
+    import tempfile
+    base_dir = tempfile.mkdtemp()
+    content = 'Title line\r\n' + ''.join('%04d ' % i for i in range(100))
+    try:
+        table = write_texts([(3, 'a/b.txt', content), (5, 'c.txt', '')], base_dir, 64,
+                            {'c.txt': {'title': 'Empty', 'author': 'x'}}, ['doc', 'hit'])
+        store = JsNgramTexts(base_dir)
+
+        def test_chunks():
+            res = (table['docs']['a/b.txt']['length'] == len(content) and
+                   os.path.exists(os.path.join(base_dir, chunk_file_name(3, 7))) and
+                   not os.path.exists(os.path.join(base_dir, chunk_file_name(3, 8))))
+            print('[%s]: chunks should be written by size.  test_chunks' % ('OK' if res else 'NG'))
+
+        def test_read_text():
+            res = all(store.read_text('a/b.txt', s, e) == content[s:e]
+                      for s, e in ((0, 10), (60, 70), (10, 300), (500, 600), (64, 128)))
+            res = res and store.read_text('a/b.txt') == content and store.read_text('c.txt') == ''
+            print('[%s]: text should be read across chunks.  test_read_text' % ('OK' if res else 'NG'))
+
+        def test_titles():
+            res = (store.title('a/b.txt') == 'Title line' and store.title('c.txt') == 'Empty' and
+                   store.docs['c.txt']['author'] == 'x' and store.table['header'] == ['doc', 'hit'])
+            print('[%s]: titles should be taken or given.  test_titles' % ('OK' if res else 'NG'))
+
+        def test_snippet():
+            start, text = store.snippet('a/b.txt', 200, 4, 40)
+            res = start == 182 and text == content[182:222]
+            print('[%s]: snippet should be around the hit.  test_snippet' % ('OK' if res else 'NG'))
+
+        test_chunks()
+        test_read_text()
+        test_titles()
+        test_snippet()
+    finally:
+        shutil.rmtree(base_dir)
+
+if __name__ == '__main__':
+    test()
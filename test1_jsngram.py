@@ -8,11 +8,21 @@ if sys.version_info[0]  == 2:
     chr = unichr
 
 import os
+import io
 import shutil
+import codecs
+import json
+import random
 
 import jsngram.jsngram
 import jsngram.dir2
 import jsngram.text2
+import jsngram.sorter
+import jsngram.searcher
+import jsngram.session
+import jsngram.bench
+import jsngram.stats
+import jsngram.texts
 
 def test():
     base_dir = os.path.realpath('/scratch') # may be './scratch', or others.
@@ -55,13 +65,14 @@ def test():
         return ix
         
     def make_index_by_files_inc(n=ngram_size, shorter=ngram_shorter,
-          src=in_dir, dest=out_dir, flat=flat_dir, ignore=ch_ignore):
+          src=in_dir, dest=out_dir, flat=flat_dir, ignore=ch_ignore,
+          processes=1):
         """
         text files in src directory will be indexed.
         """
         ix = jsngram.jsngram.JsNgram(n, shorter, src, dest, flat, ignore)
         entries = jsngram.dir2.list_files(src)
-        ix.add_files_to_json(entries, verbose_print)
+        ix.add_files_to_json(entries, verbose_print, processes)
         return ix
         
     def remove_entries(dest):
@@ -75,8 +86,8 @@ def test():
             else:
                 shutil.rmtree(fullpath)
         
-    def read_index(src=out_dir):
-        chk = jsngram.jsngram.JsNgramReader(src)
+    def read_index(src=out_dir, binary=False):
+        chk = jsngram.jsngram.JsNgramReader(src, flat_dir, binary)
         chk.read_files(verbose_print)
         return chk
         
@@ -89,7 +100,7 @@ def test():
           )
         chk = read_index()
         chk.reverse([u'this/is/a.txt', u'that/may/be/too.txt'], verbose_print)
-        res = 'OK' if chk.db == ix.db else 'NG'
+        res = 'OK' if chk.db == ix.to_dict() else 'NG'
         print('[%s]: db should match.  suite1' % res)
         
     def test_suite2():
@@ -101,14 +112,14 @@ def test():
           )
         chk = read_index()
         chk.reverse([u'http://a.is.ja', u'http://b.is.ja/too'], verbose_print)
-        res = 'OK' if chk.db == ix.db else 'NG'
+        res = 'OK' if chk.db == ix.to_dict() else 'NG'
         print('[%s]: db should match.  suite2' % res)
         
     def test_suite3():
         ix = make_index_by_files()
         chk = read_index()
         #chk.reverse([u'this/is/a.txt', u'that/may/be/too.txt'], verbose_print)
-        res = 'OK' if chk.db == ix.db else 'NG'
+        res = 'OK' if chk.db == ix.to_dict() else 'NG'
         print('[%s]: db should match.  suite3' % res)
         
     def test_suite4():
@@ -130,15 +141,716 @@ def test():
             fullpath = os.path.join(out_dir, entry)
             jsngram.json2.json_end(fullpath)
         chk = read_index()
-        res = 'OK' if chk.db == ix.db else 'NG'
+        res = 'OK' if chk.db == ix.to_dict() else 'NG'
         print('[%s]: db should match.  suite6' % res)
         
+    def test_suite7():
+        ix1 = make_index_by_strings([])
+        entries = jsngram.dir2.list_files(in_dir)
+        ix1.add_files(entries)
+        remove_entries(out_dir)
+        ix2 = make_index_by_files_inc(processes=2)
+        for entry in jsngram.dir2.list_files(out_dir):
+            fullpath = os.path.join(out_dir, entry)
+            jsngram.json2.json_end(fullpath)
+        chk = read_index()
+        res = 'OK' if chk.db == ix1.to_dict() == ix2.to_dict() else 'NG'
+        print('[%s]: parallel db should match.  suite7' % res)
+        
+    def test_suite8():
+        ix = make_index_by_files()
+        remove_entries(out_dir)
+        sorter = jsngram.sorter.JsNgramSorter(ngram_size, ngram_shorter,
+            in_dir, out_dir, flat_dir, ch_ignore, budget=1)  # spill every file
+        sorter.add_files(jsngram.dir2.list_files(in_dir), verbose_print)
+        files = sorter.finish(verbose_print)
+        chk = read_index()
+        res = 'OK' if chk.db == ix.to_dict() and len(files) == len(ix.db) else 'NG'
+        print('[%s]: sorted runs db should match.  suite8' % res)
+        
+    def test_suite9():
+        src = os.path.join(base_dir, 'upd')
+        if os.path.exists(src):
+            shutil.rmtree(src)
+        shutil.copytree(in_dir, src)
+        remove_entries(out_dir)
+        ix = jsngram.jsngram.JsNgram(ngram_size, ngram_shorter, src, out_dir,
+                                     flat_dir, ch_ignore)
+        changes1 = ix.update(verbose=verbose_print)
+        entries = jsngram.dir2.list_files(src)
+        with open(os.path.join(src, entries[0]), 'a') as outfile:
+            outfile.write(' appended text')
+        os.remove(os.path.join(src, entries[1]))
+        with open(os.path.join(src, 'new.txt'), 'w') as outfile:
+            outfile.write('a new document')
+        changes2 = ix.update(verbose=verbose_print)
+        chk = read_index()
+        dest = os.path.join(base_dir, 'upd-idx')
+        if not os.path.exists(dest):
+            os.makedirs(dest)
+        ix2 = make_index_by_files(src=src, dest=dest)
+        expected = dict((k, sorted(v)) for k, v in ix2.to_dict().items())
+        actual = dict((k, sorted(v)) for k, v in chk.db.items())
+        res = 'OK' if (expected == actual and
+                       len(changes1['added']) == len(entries) and
+                       changes2['added'] == ['new.txt'] and
+                       changes2['modified'] == [entries[0]] and
+                       changes2['deleted'] == [entries[1]]) else 'NG'
+        print('[%s]: updated db should match.  suite9' % res)
+        sources = ix.read_manifest()
+        res = 'OK' if (sorted(sources.keys()) == sorted(jsngram.dir2.list_files(src)) and
+                       all('keys' not in entry for entry in sources.values()) and
+                       len(os.listdir(os.path.join(out_dir, '.manifest'))) == len(sources) and
+                       ix.read_source_keys(u'new.txt', sources[u'new.txt']) ==
+                       sorted(k for k, v in ix2.to_dict().items()
+                              if any(path == u'new.txt' for path, start in v))) else 'NG'
+        print('[%s]: keys of sources should be kept apart.  suite9' % res)
+        
+    def test_suite10():
+        ix = make_index_by_files()
+        searcher = jsngram.searcher.JsNgramSearcher(out_dir, ngram_size, flat_dir)
+        texts = {}
+        for entry in jsngram.dir2.list_files(in_dir):
+            with codecs.open(os.path.join(in_dir, entry), 'r', 'utf-8') as infile:
+                texts[entry] = infile.read().lower()
+        res = 'OK'
+        for what in [u'alice', u'the', u'a', u'もっとも', u'zzzz', u'Rabbit']:
+            expected = {}
+            for entry, text in texts.items():
+                hits = [[i] for i in range(len(text)) if text.startswith(what.lower(), i)]
+                if hits:
+                    expected[entry] = hits
+            result = searcher.search(what, partial=True)
+            found = sum(len(ix.postings(key)) for key in searcher.generate_texts(what.lower())
+                        if ix.has_key(key))
+            if result['perfection'] != expected:
+                res = 'NG'
+            if expected and result['hits']['found'][0] != found:
+                res = 'NG'
+        print('[%s]: search should find every occurrence.  suite10' % res)
+        
+    def test_suite11():
+        ix = make_index_by_files()
+        remove_entries(out_dir)
+        ix.to_binary(verbose_print)
+        chk = read_index(binary=True)
+        searcher = jsngram.searcher.JsNgramSearcher(out_dir, ngram_size, flat_dir, True)
+        res = 'OK' if (chk.db == ix.to_dict() and
+                       searcher.search(u'alice')['hits']['perfection'][0] > 0) else 'NG'
+        print('[%s]: binary db should match.  suite11' % res)
+        
+    def test_suite12():
+        ix = make_index_by_files()
+        remove_entries(out_dir)
+        seg = ix.to_segment(os.path.join(base_dir, 'index.seg'), verbose_print)
+        chk = read_index(seg)
+        searcher = jsngram.searcher.JsNgramSearcher(seg, ngram_size)
+        found = (searcher.search(u'alice')['hits']['perfection'][0] > 0 and
+                 chk.read_key(u'zq') is None and chk.read_key(u'abc') is None)
+        chk.segment.export_json(out_dir, flat_dir, verbose_print)
+        exported = read_index()
+        res = 'OK' if chk.db == exported.db == ix.to_dict() and found else 'NG'
+        print('[%s]: segment db should match.  suite12' % res)
+        
+    def test_suite13():
+        ix = make_index_by_files()
+        remove_entries(out_dir)
+        ix.to_json(verbose_print, buckets=8)
+        chk = jsngram.jsngram.JsNgramReader(out_dir, buckets=8)
+        chk.read_files(verbose_print)
+        searcher = jsngram.searcher.JsNgramSearcher(out_dir, ngram_size, buckets=8)
+        found = searcher.search(u'alice')['hits']['perfection'][0] > 0
+        n_files = len(jsngram.dir2.list_files(out_dir))
+        res = 'OK' if chk.db == ix.to_dict() and found and n_files <= 8 else 'NG'
+        print('[%s]: bucket db should match.  suite13' % res)
+        
+    def test_suite14():
+        ix = make_index_by_files()
+        remove_entries(out_dir)
+        session = jsngram.session.JsNgramSession(ngram_size, ngram_shorter,
+            in_dir, out_dir, flat_dir, ch_ignore, max_open=4)
+        session.begin()
+        for entry in jsngram.dir2.list_files(in_dir):
+            session.add_files([entry], verbose_print)
+        files = session.finish(verbose_print)
+        chk = read_index()
+        res = 'OK' if chk.db == ix.to_dict() and len(files) == len(ix.db) else 'NG'
+        print('[%s]: session db should match.  suite14' % res)
+        
+    def test_suite15():
+        ix = make_index_by_files()
+        chk = jsngram.jsngram.JsNgramReader(out_dir, cache_size=3)
+        keys = sorted(chk.keys())
+        first = chk.read_key(keys[0])
+        again = chk.read_key(keys[0])
+        loaded = chk.prefetch(keys[1:4] + [u'zq'])
+        info = chk.cache_info()
+        res = 'OK' if (keys == sorted(ix.db.keys()) and
+                       first == again == ix.postings(keys[0]) and
+                       loaded == 4 and info['size'] == 3 and
+                       info['hits'] == 1 and info['misses'] == 1) else 'NG'
+        print('[%s]: lazy reader should cache keys.  suite15' % res)
+        
+    def test_suite16():
+        data = [
+                [u'this/is/a.txt', u'This is a document.'],
+                [u'that/may/be/too.txt', u'This is the next one.']
+            ]
+        ix = make_index_by_strings(data)
+        chk = jsngram.jsngram.JsNgramReader(out_dir)
+        forward = chk.forward()  # streaming, without read_files
+        res = 'OK'
+        for path, content in data:
+            if chk.check(forward, path, content):
+                res = 'NG'
+            if chk.reconstruct(forward, path) != u'this is a document' and \
+               chk.reconstruct(forward, path) != u'this is the next one':
+                res = 'NG'
+        if chk.check(forward, data[0][0], data[1][1]) == []:
+            res = 'NG'
+        print('[%s]: forward index should rebuild texts.  suite16' % res)
+        
+    def test_suite17():
+        ix = make_index_by_files()
+        res = 'OK'
+        for chunk_size in (1, 7, 4096):
+            ix2 = jsngram.jsngram.JsNgram(ngram_size, ngram_shorter, in_dir,
+                                          out_dir, flat_dir, ch_ignore)
+            for entry in jsngram.dir2.list_files(in_dir):
+                ix2.add_file(entry, verbose_print, chunk_size)
+            if ix2.to_dict() != ix.to_dict():
+                res = 'NG'
+        print('[%s]: streamed db should match.  suite17' % res)
+        rnd = random.Random(17)
+        res = 'OK'
+        for ignore in (r'\r\n', r'ab', r'[ ]{2,}', r'[\s.]+'):
+            for i in range(100):
+                text = ''.join(rnd.choice('ab \r\n.cd') for j in range(rnd.randint(0, 40)))
+                ix1 = jsngram.jsngram.JsNgram(ngram_size, ngram_shorter, ignore=ignore)
+                ix1.add_document('x', text)
+                for chunk_size in (1, 2, 3, 5):
+                    ix2 = jsngram.jsngram.JsNgram(ngram_size, ngram_shorter, ignore=ignore)
+                    ix2.add_stream('x', io.StringIO(text), chunk_size)
+                    if ix2.to_dict() != ix1.to_dict():
+                        res = 'NG'
+        print('[%s]: streamed db should match with other ignore patterns.  suite17' % res)
+        
+    def test_suite18():
+        ix = make_index_by_files()
+        docs = []
+        for entry in jsngram.dir2.list_files(in_dir):
+            with codecs.open(os.path.join(in_dir, entry), 'r', 'utf-8') as infile:
+                docs.append((entry, infile.read()))
+        res = 'OK'
+        for processes in (1, 2):
+            ix2 = jsngram.jsngram.JsNgram(ngram_size, ngram_shorter, in_dir,
+                                          out_dir, flat_dir, ch_ignore)
+            ix2.add_documents(docs, verbose_print, processes)
+            if ix2.to_dict() != ix.to_dict():
+                res = 'NG'
+        print('[%s]: batch of documents should make the same db.  suite18' % res)
+        # folding depending on the context or changing the length
+        ix2 = jsngram.jsngram.JsNgram(3, True)
+        ix2.add_document('a', 'ΟΔΟΣ İSTANBUL Straße')
+        res = 'OK'
+        for key, path, start in (('σ', 'a', 3), ('ος', 'a', 2), ('i̇', 'a', 5)):
+            if [path, start] not in ix2.postings(key):
+                res = 'NG'
+        print('[%s]: each N-gram should be folded alone when needed.  suite18' % res)
+        
+    def test_suite19():
+        res = 'OK'
+        for kind in jsngram.bench.kinds:
+            data = jsngram.bench.make_corpus(kind, 3, 300, 7)
+            if data != jsngram.bench.make_corpus(kind, 3, 300, 7):
+                res = 'NG'
+            if data == jsngram.bench.make_corpus(kind, 3, 300, 8):
+                res = 'NG'
+        print('[%s]: corpus should be made the same by the seed.  suite19' % res)
+        result = jsngram.bench.run_bench('mixed', 3, 300, layout='segment', queries=10)
+        res = 'OK' if (result['write']['files'] == 1 and
+                       result['load']['keys'] == result['add_document']['keys'] and
+                       result['query']['hit_queries'] == 10) else 'NG'
+        print('[%s]: bench should measure a build.  suite19' % res)
+        
+    def test_suite20():
+        events = []
+        stats = jsngram.stats.JsNgramStats(lambda stage, done, total: events.append((stage, done, total)))
+        ix = jsngram.jsngram.JsNgram(ngram_size, ngram_shorter, in_dir,
+                                     out_dir, flat_dir, ch_ignore)
+        ix.stats = stats
+        entries = jsngram.dir2.list_files(in_dir)
+        with stats.capture(profile=True, memory=True):
+            ix.add_files(entries)
+            remove_entries(out_dir)
+            ix.to_json(threads=1)
+        counts = stats.report()['counters']
+        n_bytes = sum(os.path.getsize(os.path.join(out_dir, f))
+                      for f in jsngram.dir2.list_files(out_dir))
+        res = 'OK' if (counts['documents'] == len(entries) and
+                       counts['keys'] == len(ix.db) and
+                       counts['files_created'] == len(ix.db) and
+                       counts['postings'] == sum(len(x) for x in ix.db.values()) // 2 and
+                       counts['bytes_written'] == n_bytes) else 'NG'
+        print('[%s]: stats should count the build.  suite20' % res)
+        res = 'OK' if (events[len(entries)-1] == ('index', len(entries), len(entries)) and
+                       events[-1] == ('write', len(ix.db), len(ix.db))) else 'NG'
+        print('[%s]: progress should be notified.  suite20' % res)
+        report = stats.report()
+        res = 'OK' if (report['profile'] and report['memory']['peak'] > 0 and
+                       report['phases']['read'] > 0 and report['phases']['write'] > 0) else 'NG'
+        print('[%s]: report should have phases, profile and memory.  suite20' % res)
+        ix2 = make_index_by_files()
+        res = 'OK' if ix2.to_dict() == ix.to_dict() else 'NG'
+        print('[%s]: stats should not change db.  suite20' % res)
+        
+    def test_suite21():
+        ix = make_index_by_files()
+        searcher = jsngram.searcher.JsNgramSearcher(out_dir, ngram_size, flat_dir)
+        words = [u'alice', u'the', u'a', u'もっとも', u'zzzz', u'Rabbit']
+        expected = dict((what, searcher.search(what, partial=True)) for what in words)
+        remove_entries(out_dir)
+        ix.to_json(verbose_print, page_size=20)
+        chk = read_index()
+        n_pages = len([f for f in jsngram.dir2.list_files(out_dir) if '.p' in f])
+        res = 'OK' if chk.db == ix.to_dict() and n_pages > 0 else 'NG'
+        print('[%s]: paged db should match.  suite21' % res)
+        searcher = jsngram.searcher.JsNgramSearcher(out_dir, ngram_size, flat_dir)
+        res = 'OK'
+        for what in words:
+            if searcher.search(what, partial=True) != expected[what]:
+                res = 'NG'
+            for limit in (1, 2, 1000):
+                result = searcher.search(what, limit=limit)
+                perfection = expected[what]['perfection']
+                if any(perfection[doc] != hits for doc, hits in result['perfection'].items()):
+                    res = 'NG'
+                if result['more'] and len(result['perfection']) < limit:
+                    res = 'NG'
+                if not result['more'] and result['perfection'] != perfection:
+                    res = 'NG'
+        print('[%s]: paged search should stop at limit.  suite21' % res)
+        
+    def test_suite22():
+        ix = make_index_by_files()
+        expected = ix.to_dict()
+        remove_entries(out_dir)
+        ix.to_json(verbose_print, grouped=True)
+        chk = read_index()
+        data = chk.read_file(os.path.join(out_dir, jsngram.jsngram.key_file_name(u'al', flat_dir)))
+        with codecs.open(os.path.join(out_dir, jsngram.jsngram.key_file_name(u'al', flat_dir)),
+                         'r', 'utf-8') as infile:
+            raw = json.load(infile)
+        res = 'OK' if (chk.db == expected and data == expected[u'al'] and
+                       all(starts == sorted(starts) for path, starts in raw)) else 'NG'
+        print('[%s]: grouped db should match.  suite22' % res)
+        remove_entries(out_dir)
+        entries = jsngram.dir2.list_files(in_dir)
+        ix2 = jsngram.jsngram.JsNgram(ngram_size, ngram_shorter, in_dir,
+                                      out_dir, flat_dir, ch_ignore)
+        files = set(ix2.add_files_to_json(entries[:2], verbose_print, grouped=True))
+        files.update(ix2.add_files_to_json(entries[2:], verbose_print, grouped=True))
+        for file_name in files:
+            jsngram.json2.json_end(file_name)
+        chk = read_index()
+        res = 'OK' if chk.db == expected else 'NG'
+        print('[%s]: grouped incremental db should match.  suite22' % res)
+        
+    def test_suite23():
+        ix = make_index_by_files()
+        expected = ix.to_dict()
+        remove_entries(out_dir)
+        ix.stats = jsngram.stats.JsNgramStats()
+        ix.to_json(verbose_print, gzip_level=6, gzip_min_size=100)
+        ratio = ix.stats.report()['rates'].get('gzip_ratio')
+        ix.stats = None
+        res = 'OK' if ratio and ratio < 1 else 'NG'
+        n_gzip = 0
+        for entry in jsngram.dir2.list_files(out_dir):
+            file_name = os.path.join(out_dir, entry)
+            if entry.endswith('.gz'):
+                continue
+            has_gzip = os.path.exists(file_name + '.gz')
+            if has_gzip != (os.path.getsize(file_name) >= 100):
+                res = 'NG'
+            if has_gzip:
+                n_gzip += 1
+                if (jsngram.json2.read_text(file_name + '.gz') !=
+                    jsngram.json2.read_text(file_name)):
+                    res = 'NG'
+                os.remove(file_name)  # leave the gzip sibling only
+        if n_gzip == 0:
+            res = 'NG'
+        print('[%s]: gzip siblings should be written over min size.  suite23' % res)
+        chk = read_index()
+        searcher = jsngram.searcher.JsNgramSearcher(out_dir, ngram_size, flat_dir)
+        res = 'OK' if (chk.db == expected and
+                       searcher.search(u'alice')['hits']['perfection'][0] > 0) else 'NG'
+        print('[%s]: gzip siblings should be read.  suite23' % res)
+        remove_entries(out_dir)
+        ix.to_json(verbose_print, buckets=4, gzip_level=9, gzip_min_size=0)
+        for entry in jsngram.dir2.list_files(out_dir):
+            if not entry.endswith('.gz'):
+                os.remove(os.path.join(out_dir, entry))
+        chk = jsngram.jsngram.JsNgramReader(out_dir, buckets=4)
+        chk.read_files()
+        res = 'OK' if chk.db == expected and len(list(chk.keys())) == len(expected) else 'NG'
+        print('[%s]: gzip bucket files should be read.  suite23' % res)
+        entries = jsngram.dir2.list_files(in_dir)
+        remove_entries(out_dir)
+        ix2 = jsngram.jsngram.JsNgram(ngram_size, ngram_shorter, in_dir, out_dir, flat_dir, ch_ignore)
+        ix2.stats = jsngram.stats.JsNgramStats()
+        files = ix2.add_files_to_json(entries, verbose_print)
+        source_size, gzip_size = ix2.end_json(files, verbose_print, 6, 100)
+        report = ix2.stats.report()
+        res = 'OK' if (0 < gzip_size < source_size and
+                       report['counters']['gzip_bytes'] == gzip_size and
+                       report['counters']['gzip_source_bytes'] == source_size and
+                       report['rates']['gzip_ratio'] == gzip_size / source_size and
+                       read_index().db == expected) else 'NG'
+        remove_entries(out_dir)
+        session = jsngram.session.JsNgramSession(ngram_size, ngram_shorter, in_dir, out_dir,
+                                                 flat_dir, ch_ignore)
+        session.ix.stats = jsngram.stats.JsNgramStats()
+        session.begin()
+        session.add_files(entries)
+        session.finish(verbose_print, 6, 100)
+        report = session.ix.stats.report()
+        if not (report['counters']['gzip_files'] > 0 and report['rates'].get('gzip_ratio', 1) < 1):
+            res = 'NG'
+        print('[%s]: gzip siblings of incremental builds should be reported.  suite23' % res)
+        src = os.path.join(base_dir, 'upd')
+        if os.path.exists(src):
+            shutil.rmtree(src)
+        shutil.copytree(in_dir, src)
+        remove_entries(out_dir)
+        ix = jsngram.jsngram.JsNgram(ngram_size, ngram_shorter, src, out_dir,
+                                     flat_dir, ch_ignore)
+        ix.update(verbose=verbose_print, gzip_level=6, gzip_min_size=0)
+        entries = jsngram.dir2.list_files(src)
+        os.remove(os.path.join(src, entries[0]))
+        with open(os.path.join(src, entries[1]), 'a') as outfile:
+            outfile.write(' appended text')
+        ix.update(verbose=verbose_print)
+        res = 'OK'
+        for entry in jsngram.dir2.list_files(out_dir):
+            file_name = os.path.join(out_dir, entry)
+            if entry.endswith('.gz') and not (
+                    os.path.exists(file_name[:-3]) and
+                    jsngram.json2.read_text(file_name) == jsngram.json2.read_text(file_name[:-3])):
+                res = 'NG'
+        ix2 = make_index_by_files(src=src, dest=os.path.join(base_dir, 'upd-idx'))
+        chk = read_index()
+        expected = dict((k, sorted(v)) for k, v in ix2.to_dict().items())
+        if dict((k, sorted(v)) for k, v in chk.db.items()) != expected:
+            res = 'NG'
+        print('[%s]: stale gzip siblings should be removed on update.  suite23' % res)
+        
+    def test_suite24():
+        ix = make_index_by_files()
+        table = ix.to_texts(chunk_size=50, titles={'sub/ja.txt': 'Japanese'}, header=['doc', 'hit'])
+        store = jsngram.texts.JsNgramTexts(os.path.join(out_dir, 'texts'))
+        res = 'OK' if (list(table['docs'].keys()) == ix.docs and
+                       store.title('sub/ja.txt') == 'Japanese' and
+                       store.table['header'] == ['doc', 'hit']) else 'NG'
+        print('[%s]: text table should list documents.  suite24' % res)
+        res = 'OK'
+        for path in ix.docs:
+            with codecs.open(os.path.join(in_dir, path), 'r', 'utf-8') as infile:
+                content = infile.read()
+            if store.read_text(path) != content:
+                res = 'NG'
+            it = iter(ix.db[u'al'])
+            for i, start in zip(it, it):
+                if ix.docs[i] != path:
+                    continue
+                at, text = store.snippet(path, start, 2, 30)
+                if text != content[at:at+30] or text[start-at:start-at+2].lower() != u'al':
+                    res = 'NG'
+        print('[%s]: snippets should be the text around hits.  suite24' % res)
+        
+    def test_suite25():
+        org = os.path.join(base_dir, 'org-nfkc')
+        txt = os.path.join(base_dir, 'txt-nfkc')
+        for path in (org, txt):
+            if os.path.exists(path):
+                shutil.rmtree(path)
+        data = [['a.txt', u'ﾃｽﾄ ﾃﾞｰﾀ、ＡＢＣ１２３\r\nｶﾞｷﾞｸﾞｹﾞｺﾞ ㈱ ﾊﾟﾋﾟﾌﾟ'],
+                ['b/c.txt', u'ｱｲｳ\u3000ｴｵ e\u0301 ﬁle ｶﾞ']]
+        for path, content in data:
+            file_name = os.path.join(org, path)
+            jsngram.dir2.ensure_dir(file_name)
+            with codecs.open(file_name, 'w', 'utf-8') as outfile:
+                outfile.write(content)
+        entries = jsngram.dir2.list_files(org)
+        jsngram.text2.normalize_texts(org, txt)
+        ix = jsngram.jsngram.JsNgram(ngram_size, ngram_shorter, txt, out_dir, flat_dir, ch_ignore)
+        ix.add_files(entries)
+        res = 'OK'
+        for processes, chunk_size in ((1, None), (1, 3), (2, None)):
+            ix2 = jsngram.jsngram.JsNgram(ngram_size, ngram_shorter, org, out_dir,
+                                          flat_dir, ch_ignore, normalize=True)
+            ix2.stats = jsngram.stats.JsNgramStats()
+            if chunk_size:
+                for entry in entries:
+                    ix2.add_file(entry, verbose_print, chunk_size)
+            else:
+                ix2.add_files(entries, verbose_print, processes)
+            if ix2.to_dict() != ix.to_dict():
+                res = 'NG'
+            if processes == 1 and not chunk_size and ix2.stats.times['normalize'] <= 0:
+                res = 'NG'
+        print('[%s]: normalizing as read should make the same db.  suite25' % res)
+        file_name = os.path.join(org, 'cr.txt')
+        with open(file_name, 'wb') as outfile:
+            outfile.write(b'ab\r\rcd efg\r\r\r\rh\r' + 'ｶﾞ\r\rｷﾞ x'.encode('utf-8'))
+        res = 'OK'
+        drop_cr = lambda text: text.replace('\r', '')  # deletes characters
+        whole = jsngram.jsngram.JsNgram(ngram_size, ngram_shorter, org, out_dir,
+                                        flat_dir, ch_ignore, normalize=drop_cr)
+        whole.add_file('cr.txt', verbose_print)
+        for chunk_size in (1, 2, 3, 5):
+            streamed = jsngram.jsngram.JsNgram(ngram_size, ngram_shorter, org, out_dir,
+                                               flat_dir, ch_ignore, normalize=drop_cr)
+            streamed.add_file('cr.txt', verbose_print, chunk_size)
+            if streamed.to_dict() != whole.to_dict() or len(whole.db) < 10:
+                res = 'NG'
+        os.remove(file_name)
+        print('[%s]: streamed text should not end where a part is deleted.  suite25' % res)
+        remove_entries(out_dir)
+        sorter = jsngram.sorter.JsNgramSorter(ngram_size, ngram_shorter, org, out_dir, flat_dir,
+                                              ch_ignore, budget=1, normalize=True)
+        sorter.add_files(entries, verbose_print)
+        sorter.finish(verbose_print)
+        res = 'OK' if read_index().db == ix.to_dict() else 'NG'
+        print('[%s]: sorted runs should be normalized too.  suite25' % res)
+        ix2.stats = None
+        table = ix2.to_texts(os.path.join(base_dir, 'texts-nfkc'))
+        store = jsngram.texts.JsNgramTexts(os.path.join(base_dir, 'texts-nfkc'))
+        res = 'OK' if all(store.read_text(path) == ix.read_source(path) for path in entries) else 'NG'
+        print('[%s]: text store should be normalized too.  suite25' % res)
+        for path in (org, txt, os.path.join(base_dir, 'texts-nfkc')):
+            shutil.rmtree(path)
+        
+    def test_suite26():
+        def walk(path, base=None):
+            # list_files of the baseline, by os.listdir and os.path.isfile.
+            if not base:
+                base = path
+            bag = []
+            for entry in os.listdir(path):
+                if entry[0] == '.':
+                    continue
+                fullpath = '/'.join([path, entry])
+                if os.path.isfile(fullpath):
+                    bag.append(fullpath[1+len(base):])
+                else:
+                    bag += walk(fullpath, base)
+            return bag
+        
+        tree = os.path.join(base_dir, 'walk')
+        if os.path.exists(tree):
+            shutil.rmtree(tree)
+        for name in ('a.txt', '.dot.txt', 'b/c.txt', 'b/.d/e.txt', 'b/f/g.txt',
+                     'b/f/.h', 'i j/k.TXT', '.l/m.txt', u'日本/語.txt', 'n/o/p/q.txt'):
+            file_name = os.path.join(tree, *name.split('/'))
+            jsngram.dir2.ensure_dir(file_name)
+            with open(file_name, 'w') as outfile:
+                outfile.write(name)
+        os.makedirs(os.path.join(tree, 'empty'))
+        sub = os.path.join(tree, 'b')
+        entries = jsngram.dir2.list_files(base_dir)
+        res = 'OK' if (entries == walk(base_dir) and len(entries) > 0 and
+                       jsngram.dir2.list_files(tree) == walk(tree) and
+                       list(jsngram.dir2.iter_files(tree)) == walk(tree) and
+                       jsngram.dir2.list_files(sub, tree) == walk(sub, tree) and
+                       sorted(walk(tree)) == sorted(['a.txt', 'b/c.txt', 'b/f/g.txt', 'i j/k.TXT',
+                                                     u'日本/語.txt', 'n/o/p/q.txt'])) else 'NG'
+        shutil.rmtree(tree)
+        print('[%s]: files should be walked as the baseline does.  suite26' % res)
+        entries = jsngram.dir2.list_files(base_dir)
+        txt = list(jsngram.dir2.iter_files(base_dir, ext=('.txt', '.TXT')))
+        sub = list(jsngram.dir2.iter_files(base_dir, pattern='txt/sub/*.txt'))
+        res = 'OK' if (txt == [e for e in entries if e.endswith(('.txt', '.TXT'))] and
+                       sub == [e for e in entries if e.startswith('txt/sub/') and
+                               e.endswith('.txt')] and len(sub) > 0) else 'NG'
+        print('[%s]: files should be filtered.  suite26' % res)
+        
+        dest = os.path.join(base_dir, 'apply')
+        func = os.path.relpath  # a function of (path, dest) for processes
+        expected = sorted(jsngram.dir2.apply_files(in_dir, dest, func))
+        shutil.rmtree(dest)
+        res = 'OK'
+        for processes in (False, True):
+            results = jsngram.dir2.apply_files_async(in_dir, dest, func, workers=2,
+                                                     processes=processes)
+            if sorted(results) != expected:
+                res = 'NG'
+        shutil.rmtree(dest)
+        print('[%s]: files should be applied on a pool.  suite26' % res)
+        
+    def test_suite27():
+        ix = make_index_by_files()
+        full = jsngram.searcher.JsNgramSearcher(out_dir, ngram_size, flat_dir, cover=False)
+        cover = jsngram.searcher.JsNgramSearcher(out_dir, ngram_size, flat_dir)
+        rare = jsngram.searcher.JsNgramSearcher(out_dir, ngram_size, flat_dir)
+        rare.key_stats = dict((key, len(ix.postings(key))) for key in ix.db)
+        words = [u'alice', u'the', u'a', u'もっとも', u'zzzz', u'Rabbit']
+        for entry in jsngram.dir2.list_files(in_dir):
+            with codecs.open(os.path.join(in_dir, entry), 'r', 'utf-8') as infile:
+                text = infile.read()
+            words += [text[i:i+size] for i in range(0, len(text), 37) for size in (3, 6, 11)]
+        res = 'OK'
+        for what in words:
+            expected = full.search(what)['perfection']
+            if cover.search(what)['perfection'] != expected:
+                res = 'NG'
+            if rare.search(what)['perfection'] != expected:
+                res = 'NG'
+        print('[%s]: a cover of N-grams should find the same.  suite27' % res)
+        what = u'would you tell me'
+        offsets, texts = cover.plan_texts(what)
+        res = 'OK' if (offsets[0] == 0 and offsets[-1] == len(what) - ngram_size and
+                       len(texts) == (len(what) + ngram_size - 1) // ngram_size and
+                       all(b - a <= ngram_size for a, b in zip(offsets, offsets[1:]))) else 'NG'
+        costs = [sum(rare.key_count(t) for t in s.plan_texts(what)[1]) for s in (cover, rare)]
+        if costs[1] > costs[0] or len(rare.plan_texts(what)[1]) != len(texts):
+            res = 'NG'
+        print('[%s]: a cover should be of the fewest and rarest N-grams.  suite27' % res)
+        
+    def test_suite28():
+        ix = jsngram.jsngram.JsNgram(ngram_size, ngram_shorter, in_dir, out_dir, flat_dir, ch_ignore)
+        for entry in jsngram.dir2.list_files(in_dir):
+            ix.add_file(entry, verbose_print)
+        remove_entries(out_dir)
+        ix.to_json(verbose_print, key_stats=8)
+        chk = jsngram.jsngram.JsNgramReader(out_dir, flat_dir)
+        stats = chk.read_key_stats()
+        res = 'OK' if sorted(stats.keys()) == sorted(ix.db.keys()) else 'NG'
+        for key, postings in ix.db.items():
+            file_name = os.path.join(out_dir, jsngram.jsngram.key_file_name(key, flat_dir))
+            if stats[key] != [len(postings) // 2, len(set(postings[0::2])),
+                              os.path.getsize(file_name)]:
+                res = 'NG'
+        print('[%s]: key statistics should match the index.  suite28' % res)
+        expected = dict((key, entry[:2]) for key, entry in stats.items())
+        remove_entries(out_dir)
+        entries = jsngram.dir2.list_files(in_dir)
+        ix2 = jsngram.jsngram.JsNgram(ngram_size, ngram_shorter, in_dir,
+                                      out_dir, flat_dir, ch_ignore)
+        files = set(ix2.add_files_to_json(entries[:2], verbose_print, key_stats=8))
+        files.update(ix2.add_files_to_json(entries[2:], verbose_print, key_stats=8))
+        for file_name in files:
+            jsngram.json2.json_end(file_name)
+        stats = jsngram.jsngram.JsNgramReader(out_dir, flat_dir).read_key_stats()
+        res = 'OK' if dict((key, entry[:2]) for key, entry in stats.items()) == expected else 'NG'
+        for key, entry in stats.items():
+            file_name = os.path.join(out_dir, jsngram.jsngram.key_file_name(key, flat_dir))
+            if entry[2] != os.path.getsize(file_name):
+                res = 'NG'
+        print('[%s]: incremental key statistics should add up.  suite28' % res)
+        searcher = jsngram.searcher.JsNgramSearcher(out_dir, ngram_size, flat_dir)
+        found = searcher.search(u'alice zzzz')
+        reader = searcher.reader
+        res = 'OK' if (found['hits']['perfection'] == [0, 0] and
+                       reader.misses == 0 and not reader.cache and
+                       0 < len(reader.shards_loaded) < 8) else 'NG'
+        plain = jsngram.searcher.JsNgramSearcher(out_dir, ngram_size, flat_dir, cover=False)
+        plain.reader.key_shards = 0  # as if without key statistics
+        for what in (u'alice', u'Rabbit', u'もっとも', u'the queen'):
+            if searcher.search(what)['perfection'] != plain.search(what)['perfection']:
+                res = 'NG'
+        print('[%s]: a missing key should be known before loading.  suite28' % res)
+        src = os.path.join(base_dir, 'upd')
+        if os.path.exists(src):
+            shutil.rmtree(src)
+        shutil.copytree(in_dir, src)
+        remove_entries(out_dir)
+        ix = jsngram.jsngram.JsNgram(ngram_size, ngram_shorter, src, out_dir, flat_dir, ch_ignore)
+        ix.update(verbose=verbose_print)
+        ix.clear()
+        for entry in jsngram.dir2.list_files(src):
+            ix.add_file(entry, verbose_print)
+        ix.to_json(verbose_print, key_stats=4)
+        entries = jsngram.dir2.list_files(src)
+        os.remove(os.path.join(src, entries[0]))
+        with open(os.path.join(src, entries[1]), 'a') as outfile:
+            outfile.write(' appended text')
+        with open(os.path.join(src, 'b.txt'), 'w') as outfile:
+            outfile.write('zebra')
+        ix.update(verbose=verbose_print)
+        dest = os.path.join(base_dir, 'upd-idx')
+        if os.path.exists(dest):
+            shutil.rmtree(dest)
+        os.makedirs(dest)
+        ix2 = make_index_by_files(src=src, dest=dest)
+        ix2.to_json(verbose_print, key_stats=4)
+        searcher = jsngram.searcher.JsNgramSearcher(out_dir, ngram_size, flat_dir)
+        res = 'OK' if (jsngram.jsngram.JsNgramReader(out_dir, flat_dir).read_key_stats() ==
+                       jsngram.jsngram.JsNgramReader(dest, flat_dir).read_key_stats() and
+                       searcher.search(u'zebra')['hits']['perfection'] == [1, 1]) else 'NG'
+        print('[%s]: key statistics should be updated.  suite28' % res)
+        ix2.to_json(verbose_print)
+        res = 'OK' if jsngram.jsngram.JsNgramReader(dest, flat_dir).read_key_stats() is None else 'NG'
+        print('[%s]: stale key statistics should be removed.  suite28' % res)
+        
+    def test_suite29():
+        src = os.path.join(base_dir, 'upd')
+        if os.path.exists(src):
+            shutil.rmtree(src)
+        shutil.copytree(in_dir, src)
+        remove_entries(out_dir)
+        ix = jsngram.jsngram.JsNgram(ngram_size, ngram_shorter, src, out_dir,
+                                     flat_dir, ch_ignore)
+        ix.update(verbose=verbose_print)
+        ix.clear()
+        for entry in jsngram.dir2.list_files(src):
+            ix.add_file(entry, verbose_print)
+        ix.to_json(verbose_print, grouped=True)
+        with open(os.path.join(src, 'new.txt'), 'w') as outfile:
+            outfile.write('he said a new zebra document')
+        ix.update(verbose=verbose_print)
+        chk = read_index()
+        ix2 = make_index_by_files(src=src, dest=os.path.join(base_dir, 'upd-idx'))
+        expected = dict((k, sorted(v)) for k, v in ix2.to_dict().items())
+        actual = dict((k, sorted(v)) for k, v in chk.db.items())
+        grouped = 0
+        for key in (u'he', u'ze'):
+            file_name = os.path.join(out_dir, jsngram.jsngram.key_file_name(key, flat_dir))
+            with codecs.open(file_name, 'r', 'utf-8') as infile:
+                grouped += all(isinstance(starts, list) for path, starts in json.load(infile))
+        res = 'OK' if expected == actual and grouped == 2 else 'NG'
+        print('[%s]: grouped index should be updated as grouped.  suite29' % res)
+        
     test_suite1()
     test_suite2()
     test_suite3()
     test_suite4()
     test_suite5()
     test_suite6()
+    test_suite7()
+    test_suite8()
+    test_suite9()
+    test_suite10()
+    test_suite11()
+    test_suite12()
+    test_suite13()
+    test_suite14()
+    test_suite15()
+    test_suite16()
+    test_suite17()
+    test_suite18()
+    test_suite19()
+    test_suite20()
+    test_suite21()
+    test_suite22()
+    test_suite23()
+    test_suite24()
+    test_suite25()
+    test_suite26()
+    test_suite27()
+    test_suite28()
+    test_suite29()
 
 if __name__ == '__main__':
     test()